@@ -0,0 +1,47 @@
+# This file contains helpers for saving the state of a long search to a file, so that it can be resumed later.
+# It is used by the other files and you do not need to modify or run it.
+
+import hashlib
+import json
+import os
+from array import array
+
+
+def search_key(cohort_lists, *parts):
+    """
+    Return a fingerprint of everything a search depends on: the lists of possible cohorts it chooses from, and the other parts
+    (numbers of cohorts, facilitators, ...). A checkpoint is only resumed by a search with the same fingerprint, so a file left over
+    from different data or parameters is ignored. The parts must have a stable repr, so sets should be sorted first.
+    """
+    digest = hashlib.sha256(repr(parts).encode())
+    for cohorts in cohort_lists:
+        # There can be millions of cohorts, so the names are joined into one string and the times are numbered,
+        # which is much faster than writing out every cohort's datetimes
+        slots = {}
+        digest.update(array('q', [slots.setdefault((cohort[0], cohort[1]), len(slots)) for cohort in cohorts]).tobytes())
+        digest.update(repr(list(slots)).encode())
+        digest.update("\n".join(["\t".join(cohort[2]) for cohort in cohorts]).encode())
+    return digest.hexdigest()
+
+
+def save_checkpoint(file_path, state):
+    """
+    Save the search state (a dictionary of JSON values) to the file. The file is replaced in one step,
+    so an interruption while saving leaves the previous checkpoint in place.
+    """
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(temporary_path, file_path)
+
+
+def load_checkpoint(file_path, key):
+    """Load the search state saved in the file, or return None if there is no file or it was saved by a different search."""
+    try:
+        with open(file_path, 'r') as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("key") != key:
+        return None
+    return state
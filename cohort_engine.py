@@ -0,0 +1,896 @@
+# This file contains the cohort formation algorithm, used by both cohort_formation_GUI.py and cohort_formation_noGui.py.
+# It can also be imported on its own, e.g. by batch jobs or the job server, as it doesn't need tkinter or a display.
+# Modules that are only needed for some runs (the process pool, the local search, checkpoints, diagnostics and merging exports) are imported when they are first used.
+# You do not need to modify or run this file.
+
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+from intervals import normalize_intervals
+
+
+def get_possible_times(data):
+    """
+    Return the start and end of the poll on each poll date. If the poll ends at or before the time it starts
+    (e.g. an evening poll that runs past midnight in UTC), it ends on the next day.
+    """
+    possible_times = []
+    pollStartTime = data['data']['event']['pollStartTime']
+    pollEndTime = data['data']['event']['pollEndTime']
+    pollDates = data['data']['event']['pollDates']
+
+    for date in pollDates:
+        start = datetime.strptime(date + "T" + pollStartTime, "%Y-%m-%dT%H:%M:%S.%fZ")
+        end = datetime.strptime(date + "T" + pollEndTime, "%Y-%m-%dT%H:%M:%S.%fZ")
+        if end <= start:
+            end += timedelta(days=1)
+        possible_times.append((start, end))
+    return possible_times
+
+
+def index_participants(data):
+    """
+    Convert each response's availabilities to datetimes, merged into as few intervals as possible within the poll times.
+    This only depends on the data, so it can be done once for several runs with different parameters.
+    Returns a list of (applicant name, availabilities) pairs, in the order of the responses, and the possible times for the event.
+    """
+    participants = []
+
+    # Construct list of possible time slots for the event
+    possible_times = get_possible_times(data)
+
+    # Iterate through each response and extract time slots
+    for response in data['data']['event']['pollResponses']:
+        applicant_name = response['user']['name']
+
+        # Convert availability times to datetime objects, and merge them into as few intervals as possible within the poll times
+        time_slots = normalize_intervals([
+            (
+                datetime.strptime(availability['start'], "%Y-%m-%dT%H:%M:%S.%fZ"),
+                datetime.strptime(availability['end'], "%Y-%m-%dT%H:%M:%S.%fZ")
+            )
+            for availability in response['availabilities']
+        ], possible_times)
+        participants.append((applicant_name, time_slots))
+
+    return participants, possible_times
+
+
+def group_participants(participants, time_block, course_applicants, filter_by_course):
+    """
+    Sort the applicants from index_participants by course, leaving out the ones who aren't available for a whole time block.
+    The arguments and the return value are the same as for extract_participant_availabilities, apart from the possible times.
+    """
+    course_availabilities = {course: {} for course in course_applicants}
+    misc_availabilities = {}
+    participants_availabilities = {}
+    not_available = []
+
+    for applicant_name, time_slots in participants:
+        if time_slots.longest() < timedelta(hours=time_block):
+            not_available.append(applicant_name)
+            continue
+
+        if filter_by_course:
+            course = next((c for c in course_applicants if applicant_name in course_applicants[c]), None)
+            if course is not None:
+                course_availabilities[course][applicant_name] = time_slots
+            else:
+                misc_availabilities[applicant_name] = time_slots
+        else:
+            participants_availabilities[applicant_name] = time_slots
+
+    if filter_by_course:
+        return [course_availabilities, misc_availabilities], not_available
+    else:
+        return participants_availabilities, not_available
+
+
+def extract_participant_availabilities(data, time_block, course_applicants, filter_by_course):
+    """
+    Extract time availabilities for each applicant.
+    course_applicants: dictionary mapping each course to the names of the applicants who applied for it
+    When filtering by course, returns a dictionary of availabilities per course and the availabilities of applicants not assigned to a course.
+    """
+    participants, possible_times = index_participants(data)
+    availabilities, not_available = group_participants(participants, time_block, course_applicants, filter_by_course)
+    return availabilities, possible_times, not_available
+
+
+def match_dates(facilitator_data, participant_data):
+    """
+    Match the dates of the facilitator and participant data. This is done so that the facilitator and participant availabilities can be compared, 
+    even if the facilitator and participant poll dates are different.
+    Returns a dictionary mapping facilitator dates to participant dates.
+    """
+    date_mapping = {}
+    pollDates_facilitator = facilitator_data['data']['event']['pollDates']
+    pollDates_participant = participant_data['data']['event']['pollDates']
+    weekdays_participant = [datetime.strptime(date, "%Y-%m-%d").weekday() for date in pollDates_participant]
+    for date in pollDates_facilitator:
+        weekday = datetime.strptime(date, "%Y-%m-%d").weekday()
+        index = weekdays_participant.index(weekday)
+        date_mapping[date] = pollDates_participant[index]
+    
+    return date_mapping
+
+
+def extract_facilitator_availabilities(facilitator_data, participant_data):
+    """Extract facilitator availabilities from the data"""
+
+    facilitators_availabilities = {}
+    date_mapping = match_dates(facilitator_data, participant_data)
+    possible_times = get_possible_times(participant_data)
+
+
+    # Iterate through each response and extract facilitator availabilities
+    for response in facilitator_data['data']['event']['pollResponses']:
+        facilitator_name = response['user']['name']
+        time_slots = []
+        for availability in response['availabilities']:
+            # Convert availability times to datetime objects
+            start = datetime.strptime(availability['start'], "%Y-%m-%dT%H:%M:%S.%fZ")
+            end = datetime.strptime(availability['end'], "%Y-%m-%dT%H:%M:%S.%fZ")
+            # convert the date to the participant date
+            start_date = datetime.strptime(date_mapping[str(start.date())], "%Y-%m-%d")
+            end_date = datetime.strptime(date_mapping[str(end.date())], "%Y-%m-%d")
+
+            start = start.replace(year=start_date.year, month=start_date.month, day=start_date.day)
+            end = end.replace(year=end_date.year, month=end_date.month, day=end_date.day)
+            time_slots.append((start, end))
+            
+        facilitators_availabilities[facilitator_name] = normalize_intervals(time_slots, possible_times)
+
+    return facilitators_availabilities
+
+
+def check_deadline(deadline):
+    """Raise a TimeoutError if the deadline (a time.time() value, or None for no deadline) has passed."""
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError("The cohorts could not be formed within the time limit. Please increase the time limit or adjust the parameters.")
+
+
+def find_all_possible_cohorts(participants_availabilities, facilitators_availabilities, min_cohort_size, max_cohort_size, time_block, possible_times, deadline=None):
+    """Find all possible cohorts given participants and facilitators availabilities."""
+    possible_cohorts = []
+
+    # Iterate through each possible day and time slot
+    for day in possible_times:
+        start_time = day[0]
+        end_time = day[1]
+        current_time = start_time
+        while current_time + timedelta(hours=time_block) <= end_time:
+            check_deadline(deadline)
+            slot_end_time = current_time + timedelta(hours=time_block)
+
+            # Check facilitator availability for the time slot
+            available_facilitators = [
+                f for f in facilitators_availabilities
+                if facilitators_availabilities[f][0].covers(current_time, slot_end_time) and facilitators_availabilities[f][1] > 0
+            ]
+            if not available_facilitators:
+                current_time += timedelta(minutes=30)
+                continue
+
+            # Check participant availability for the time slot
+            available_participants = [
+                p for p in participants_availabilities
+                if participants_availabilities[p].covers(current_time, slot_end_time)
+            ]
+
+            # Generate all combinations of participants for the cohort
+            for size in range(min_cohort_size, max_cohort_size + 1):
+                for cohort in combinations(available_participants, size):
+                    possible_cohorts.append((current_time, slot_end_time, cohort))
+
+            
+            current_time += timedelta(minutes=30)
+    return possible_cohorts
+
+
+def is_feasible(possible_cohorts, num_cohorts, min_size, facilitators_info):
+    """Check if it's feasible to form the requested number of cohorts."""
+    if len(possible_cohorts) < num_cohorts:
+        return False
+
+    total_capacity = sum(info[1] for info in facilitators_info.values())
+    if total_capacity < num_cohorts:
+        return False
+
+    # Additional checks can be added here based on other constraints
+
+    return True
+
+
+def select_best_cohorts(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline=None):
+    """Select the best cohorts based on the number of participants and facilitator availability."""
+    return next(iter_best_cohorts(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline), ([], 0, {}))[0]
+
+
+def iter_best_cohorts(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline=None, should_stop=None, checkpoint_file=None, resume=False,
+                      try_all_facilitators=False):
+    """
+    Search for the best cohorts, yielding each selection that places more participants than the ones before it.
+    select_best_cohorts returns the first selection yielded. See iter_best_cohorts_jointly for the rest of the arguments.
+    By default only the first facilitator available for each cohort is tried, so the last selection yielded is the best one with
+    the facilitators assigned that way, which may not be the best possible one. Set try_all_facilitators to search for that.
+    """
+    single_course_info = {name: [info[0], info[1], {None}] for name, info in facilitators_info.items()}
+    for selected, value, stats in iter_best_cohorts_jointly({None: possible_cohorts}, {None: num_cohorts}, min_size, single_course_info,
+                                                            deadline, should_stop, try_all_facilitators=try_all_facilitators,
+                                                            checkpoint_file=checkpoint_file, resume=resume):
+        yield selected[None], value, stats
+
+
+def select_best_cohorts_jointly(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline=None):
+    """
+    Select the best cohorts for several courses at once, sharing the facilitators between the courses.
+    possible_cohorts: dictionary mapping each course to its possible cohorts
+    num_cohorts: dictionary mapping each course to the number of cohorts to form
+    facilitators_info: dictionary mapping each facilitator to [availabilities, capacity, courses they can facilitate]
+    Returns a dictionary mapping each course to its selected cohorts.
+    """
+    empty = {course: [] for course in possible_cohorts}
+    return next(iter_best_cohorts_jointly(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline), (empty, 0, {}))[0]
+
+
+def iter_best_cohorts_jointly(possible_cohorts, num_cohorts, min_size, facilitators_info, deadline=None, should_stop=None, try_all_facilitators=True,
+                              checkpoint_file=None, resume=False, checkpoint_interval=10):
+    """
+    Search for the best cohorts for several courses at once, yielding each selection that places more participants than the ones before it.
+    The first selection yielded is the one select_best_cohorts_jointly returns, and the search can be stopped after any of them.
+    Once the generator is exhausted, the last selection yielded is the best possible one, as long as try_all_facilitators is set.
+
+    possible_cohorts, num_cohorts, facilitators_info: as for select_best_cohorts_jointly
+    deadline: time.time() value after which a TimeoutError is raised
+    should_stop: optional function, checked regularly, that returns True to end the search early
+    try_all_facilitators: if False, only the first facilitator available for a cohort is tried, which is faster but can miss the best selection
+    checkpoint_file: optional file where the state of the search is saved every checkpoint_interval seconds, and when the search is stopped
+    resume: if True, carry on with the search saved in checkpoint_file, as long as it was saved by a search with the same arguments.
+    The best selection saved is yielded first, and the search then finds the same selections it would have found without the interruption.
+
+    Yields (selection, number of participants placed, search statistics) tuples, where the selection maps each course to its cohorts.
+    """
+    courses = list(possible_cohorts)
+
+    # First, check if it's feasible to form the requested number of cohorts, for each course and for all courses together
+    for course in courses:
+        course_facilitators_info = {name: info for name, info in facilitators_info.items() if course in info[2]}
+        if not is_feasible(possible_cohorts[course], num_cohorts[course], min_size, course_facilitators_info):
+            course_text = f"{course} " if course is not None else ""
+            raise ValueError(f"Unable to form the requested number of {course_text}cohorts with the given parameters. Please adjust the parameters.")
+    if sum(info[1] for info in facilitators_info.values()) < sum(num_cohorts.values()):
+        raise ValueError("Unable to form the requested number of cohorts with the given parameters. Please adjust the parameters.")
+
+    if not courses:
+        return
+
+    # Priority is given to larger cohorts (more participants)
+    sorted_cohorts = {course: sorted(possible_cohorts[course], key=lambda cohort: len(cohort[2]), reverse=True) for course in courses}
+
+    # Create a dictionary to track the remaining capacity of each facilitator, shared by all courses
+    facilitator_capacity = {facilitator: info[1] for facilitator, info in facilitators_info.items()}
+
+    # Facilitators who can lead fewer courses are tried first, so that the ones who can lead several are kept for where they are needed
+    facilitator_order = sorted(facilitators_info, key=lambda facilitator: len(facilitators_info[facilitator][2]))
+
+    # List the facilitators who could lead the cohort. Facilitators with the same availabilities, courses and remaining capacity
+    # are interchangeable, so only the first of them is tried.
+    def candidate_facilitators(course, cohort_time):
+        candidates = []
+        seen = set()
+        for facilitator in facilitator_order:
+            availabilities, _, facilitator_courses = facilitators_info[facilitator]
+            if facilitator_capacity[facilitator] <= 0 or course not in facilitator_courses:
+                continue
+            if not availabilities.covers(*cohort_time):
+                continue
+            signature = (availabilities, frozenset(facilitator_courses), facilitator_capacity[facilitator])
+            if signature not in seen:
+                seen.add(signature)
+                candidates.append(facilitator)
+                if not try_all_facilitators:
+                    break
+        return candidates
+
+    # Facilitators who are available for at least one possible cohort of each course
+    course_facilitators = {}
+    for course in courses:
+        cohort_times = {(cohort[0], cohort[1]) for cohort in possible_cohorts[course]}
+        course_facilitators[course] = {
+            facilitator for facilitator, info in facilitators_info.items()
+            if course in info[2] and any(info[0].covers(*cohort_time) for cohort_time in cohort_times)
+        }
+
+    # Groups of courses whose cohorts still to form must fit in the capacity of the facilitators who can lead at least one of them.
+    # Checking every group is exact when facilitators are shared in any way (Hall's condition), so with many courses only each course
+    # on its own and all of them together are checked.
+    if len(courses) <= 8:
+        course_groups = [[course for bit, course in enumerate(courses) if mask >> bit & 1] for mask in range(1, 2 ** len(courses))]
+    else:
+        course_groups = [[course] for course in courses] + [courses]
+    course_groups = [(group, set().union(*(course_facilitators[course] for course in group))) for group in course_groups]
+
+    # Check that the facilitators' remaining capacity can still lead the cohorts left to form for every course
+    def enough_capacity(selected):
+        for group, facilitators in course_groups:
+            needed = sum(num_cohorts[course] - len(selected[course]) for course in group)
+            if needed > 0 and sum(facilitator_capacity[facilitator] for facilitator in facilitators) < needed:
+                return False
+        return True
+
+    # The most participants that could still be placed: the largest remaining cohort for each cohort left to form
+    largest_cohort = {course: len(sorted_cohorts[course][0][2]) if sorted_cohorts[course] else 0 for course in courses}
+
+    def upper_bound(course_index, selected, remaining):
+        course = courses[course_index]
+        bound = sum(len(cohort[2]) for cohorts in selected.values() for cohort in cohorts)
+        bound += (num_cohorts[course] - len(selected[course])) * (len(remaining[0][2]) if remaining else 0)
+        bound += sum(num_cohorts[c] * largest_cohort[c] for c in courses[course_index + 1:])
+        return bound
+
+    # If the desired number of cohorts is reached for this course, move on to the next course
+    def skip_completed_courses(course_index, selected, remaining):
+        while len(selected[courses[course_index]]) == num_cohorts[courses[course_index]] and course_index + 1 < len(courses):
+            course_index += 1
+            remaining = sorted_cohorts[courses[course_index]]
+        return course_index, remaining
+
+    def new_frame(course_index, selected, remaining):
+        return [course_index, selected, remaining, candidate_facilitators(courses[course_index], (remaining[0][0], remaining[0][1])), 0, None]
+
+    # Move a frame on to its next branch, returning the node to search next, or None once all of its branches have been searched
+    def next_branch(frame):
+        course_index, selected, remaining, candidates, branch, facilitator = frame
+        course = courses[course_index]
+
+        # Coming back from the branch that used a facilitator, restore the facilitator's capacity
+        if facilitator is not None:
+            facilitator_capacity[facilitator] += 1
+            frame[5] = None
+
+        frame[4] += 1
+        current_cohort = remaining[0]
+        if branch < len(candidates):
+            # Try the current cohort with the next candidate facilitator
+            facilitator = candidates[branch]
+            facilitator_capacity[facilitator] -= 1
+            frame[5] = facilitator
+            updated_selected = dict(selected)
+            updated_selected[course] = selected[course] + [(current_cohort[0], current_cohort[1], current_cohort[2], facilitator)]
+            if not enough_capacity(updated_selected):
+                # The branch is skipped as soon as it is searched, so the remaining cohorts aren't worked out
+                return (course_index, updated_selected, [])
+            selected_names = {name for _, _, cohort, _ in updated_selected[course] for name in cohort}
+            next_remaining = [
+                c for c in remaining[1:]
+                if not any(name in selected_names for name in c[2]) and len(c[2]) >= min_size
+            ]
+            return (course_index, updated_selected, next_remaining)
+        elif branch == len(candidates):
+            # Try excluding the current cohort
+            return (course_index, selected, remaining[1:])
+        return None
+
+    if not enough_capacity({course: [] for course in courses}):
+        raise ValueError("Unable to form the requested number of cohorts with the given parameters. Please adjust the parameters.")
+
+    stats = {"nodes": 0, "solutions": 0, "elapsed": 0.0}
+    started = time.time()
+    best_value = -1
+    best = None
+
+    # The search is a depth-first backtracking search kept on an explicit stack, so it can pause at each improvement.
+    # Each frame is [course index, selection, remaining cohorts, candidate facilitators, next branch, facilitator in use],
+    # where the branches are the candidate facilitators for the first remaining cohort, and then excluding that cohort.
+    stack = []
+    node = (0, {course: [] for course in courses}, sorted_cohorts[courses[0]])
+
+    # A checkpoint is taken just before a node is searched. The search is deterministic, so the stack is saved as the number of
+    # branches taken by each frame, and the node about to be searched is the one from the last branch of the top frame.
+    # The best selection is saved as the positions of its cohorts in sorted_cohorts.
+    key = None
+    next_checkpoint = time.time() + checkpoint_interval
+    if checkpoint_file is not None:
+        from checkpoints import search_key, save_checkpoint, load_checkpoint
+        key = search_key([sorted_cohorts[course] for course in courses], courses, num_cohorts, min_size, try_all_facilitators,
+                         [(name, list(info[0]), info[1], sorted(info[2], key=str)) for name, info in facilitators_info.items()])
+
+    # The position of each cohort in sorted_cohorts, worked out on the first save as there can be millions of cohorts
+    positions = {}
+
+    def save_progress(done=False):
+        if checkpoint_file is None:
+            return
+        if best is not None and not positions:
+            positions.update({course: {cohort: index for index, cohort in enumerate(sorted_cohorts[course])} for course in courses})
+
+        # The capacity left once the branches in the path are taken again, which is checked after resuming. It is worked out from the path,
+        # since the search may have been interrupted (e.g. by Ctrl-C) halfway through moving a frame on to its next branch.
+        path_capacity = {facilitator: info[1] for facilitator, info in facilitators_info.items()}
+        for frame in stack:
+            if 0 < frame[4] <= len(frame[3]):
+                path_capacity[frame[3][frame[4] - 1]] -= 1
+
+        save_checkpoint(checkpoint_file, {
+            "key": key,
+            "done": done,
+            "path": [frame[4] for frame in stack],
+            "facilitator_capacity": path_capacity,
+            "best": None if best is None else [[[positions[course][cohort[:3]], cohort[3]] for cohort in best[course]] for course in courses],
+            "best_value": best_value,
+            "stats": stats,
+            "search_time": time.time() - started,
+        })
+
+    state = load_checkpoint(checkpoint_file, key) if resume and checkpoint_file is not None else None
+    if state is not None:
+        best_value = state["best_value"]
+        stats = state["stats"]
+        started = time.time() - state["search_time"]
+        if state["best"] is not None:
+            best = {course: [sorted_cohorts[course][index] + (facilitator,) for index, facilitator in cohorts] for course, cohorts in zip(courses, state["best"])}
+            yield {course: list(cohorts) for course, cohorts in best.items()}, best_value, dict(stats)
+        if state["done"]:
+            return
+
+        # Rebuild the stack by taking the same branches again
+        for branches in state["path"]:
+            course_index, selected, remaining = node
+            course_index, remaining = skip_completed_courses(course_index, selected, remaining)
+            stack.append(new_frame(course_index, selected, remaining))
+            for _ in range(branches):
+                node = next_branch(stack[-1])
+        if facilitator_capacity != state["facilitator_capacity"]:
+            raise ValueError(f"The search saved in {checkpoint_file} could not be resumed. Please delete the file and start the search again.")
+
+    # If the search is interrupted (e.g. by Ctrl-C, the deadline, or being closed after a selection), the progress is saved before passing it on
+    try:
+        while True:
+            if node is not None:
+                if stats["nodes"] % 100 == 0:
+                    if should_stop is not None and should_stop():
+                        save_progress()
+                        return
+                    if checkpoint_file is not None and time.time() >= next_checkpoint:
+                        save_progress()
+                        next_checkpoint = time.time() + checkpoint_interval
+                check_deadline(deadline)
+
+                course_index, selected, remaining = node
+                node = None
+                stats["nodes"] += 1
+                course_index, remaining = skip_completed_courses(course_index, selected, remaining)
+
+                # If the desired number of cohorts is reached for every course, this is a full selection
+                course = courses[course_index]
+                if len(selected[course]) == num_cohorts[course]:
+                    stats["solutions"] += 1
+                    value = sum(len(cohort[2]) for cohorts in selected.values() for cohort in cohorts)
+                    if value > best_value:
+                        best_value = value
+                        best = selected
+                        stats["elapsed"] = time.time() - started
+                        # If the search is stopped after this selection, searching this node again after resuming finds nothing new
+                        yield {c: list(cohorts) for c, cohorts in selected.items()}, value, dict(stats)
+                    continue
+
+                # Skip the branch if there aren't enough cohorts left, if the facilitators left can't lead the cohorts still to form,
+                # or if it can't beat the best selection found so far
+                if len(remaining) < num_cohorts[course] - len(selected[course]) or not enough_capacity(selected) or upper_bound(course_index, selected, remaining) <= best_value:
+                    continue
+
+                stack.append(new_frame(course_index, selected, remaining))
+                continue
+
+            if not stack:
+                save_progress(done=True)
+                return
+
+            node = next_branch(stack[-1])
+            if node is None:
+                stack.pop()
+    except BaseException:
+        save_progress()
+        raise
+
+
+def run_search(start_search, search_time=0, on_incumbent=None, should_stop=None):
+    """
+    Follow a search for the best cohorts, and return the best selection found.
+    start_search: function that takes a should_stop function and returns an iterator like iter_best_cohorts
+    search_time: seconds to keep looking for better selections after the first one (0 stops at the first one, None runs the whole search)
+    on_incumbent: optional function called with (selection, number of participants placed, search statistics) for each better selection
+    should_stop: optional function that returns True to stop the search and keep the best selection so far
+    Returns None if no selection was found.
+    """
+    stop_at = None
+
+    def stop():
+        return (stop_at is not None and time.time() >= stop_at) or (should_stop is not None and should_stop())
+
+    best = None
+    try:
+        for selection, value, stats in start_search(stop):
+            best = selection
+            if on_incumbent is not None:
+                on_incumbent(selection, value, stats)
+            if search_time is not None and stop_at is None:
+                stop_at = time.time() + search_time
+            if stop():
+                break
+    except TimeoutError:
+        # At the time limit the best selection so far is kept, as long as there is one
+        if best is None:
+            raise
+    return best
+
+
+def count_placed(cohorts):
+    """Count the participants placed in a list of cohorts."""
+    return sum(len(cohort[2]) for cohort in cohorts)
+
+
+def form_cohorts(participants_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times, local_search_time=0, heuristic_mode=False, deadline=None,
+                 search_time=0, on_incumbent=None, should_stop=None, checkpoint_file=None, resume=False):
+    """
+    Form the cohorts for one group of applicants. The exact search is used unless heuristic_mode is set, 
+    and the result is then improved with the local search for local_search_time seconds.
+    search_time, on_incumbent and should_stop are passed on to run_search, and checkpoint_file and resume to the exact search.
+    When search_time is None, every facilitator is tried for each cohort, so that the search finds the best possible cohorts.
+    should_stop also ends the local search early, keeping the best cohorts found so far.
+    """
+    if heuristic_mode:
+        from local_search import heuristic_cohorts
+        best_cohorts = heuristic_cohorts(participants_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times, time_budget=local_search_time,
+                                         should_stop=should_stop)
+        if on_incumbent is not None:
+            on_incumbent(best_cohorts, count_placed(best_cohorts), {"local search": True})
+        return best_cohorts
+
+    all_cohorts = find_all_possible_cohorts(participants_availabilities, facilitators_info, min_size, max_size, time_block, possible_times, deadline)
+    best_cohorts = run_search(lambda stop: iter_best_cohorts(all_cohorts, num_cohorts, min_size, facilitators_info, deadline, stop, checkpoint_file, resume,
+                                                             try_all_facilitators=search_time is None),
+                              search_time, on_incumbent, should_stop) or []
+    if local_search_time > 0:
+        from local_search import improve_cohorts
+        improved_cohorts = improve_cohorts(best_cohorts, participants_availabilities, facilitators_info, min_size, max_size, time_block, possible_times, time_budget=local_search_time,
+                                           should_stop=should_stop)
+        if improved_cohorts is not best_cohorts and on_incumbent is not None:
+            on_incumbent(improved_cohorts, count_placed(improved_cohorts), {"local search": True})
+        best_cohorts = improved_cohorts
+    return best_cohorts
+
+
+def facilitator_courses(course_entry):
+    """Return the set of courses a facilitator can lead, given either a single course name or a list of course names."""
+    if isinstance(course_entry, str):
+        return {course_entry}
+    return set(course_entry)
+
+
+def form_course_cohorts(course_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times, local_search_time=0, heuristic_mode=False, deadline=None,
+                        search_time=0, on_incumbent=None, should_stop=None, checkpoint_file=None, resume=False):
+    """
+    Form the cohorts for every course at once, sharing the facilitators between the courses.
+    course_availabilities: dictionary mapping each course to the availabilities of its applicants
+    facilitators_info: dictionary mapping each facilitator to [availabilities, capacity, courses they can facilitate]
+    num_cohorts: dictionary mapping each course to the number of cohorts to form
+    search_time, on_incumbent and should_stop are passed on to run_search, with the selections given per course,
+    and checkpoint_file and resume to the exact search. should_stop also ends the local search early.
+    Returns a dictionary mapping each course to its selected cohorts.
+    """
+    courses = [course for course in course_availabilities if course_availabilities[course]]
+    cohorts = {course: [] for course in course_availabilities}
+
+    # Facilitators who can lead fewer courses come first, so that the ones who can lead several are kept for where they are needed
+    facilitator_order = sorted(facilitators_info, key=lambda name: len(facilitators_info[name][2]))
+
+    def course_facilitators_info(course, used):
+        # Facilitators who can lead the course, with the capacity that is not already used by the cohorts in `used`
+        return {
+            name: [facilitators_info[name][0], facilitators_info[name][1] - sum(cohort[3] == name for other in used for cohort in used[other])]
+            for name in facilitator_order if course in facilitators_info[name][2]
+        }
+
+    if heuristic_mode:
+        from local_search import heuristic_cohorts
+
+        # Courses are formed one after the other, each using the facilitator capacity left by the ones before.
+        # If a course can't be formed with what is left, the courses are tried again starting from the next course.
+        for rotation in range(len(courses)):
+            cohorts = {course: [] for course in course_availabilities}
+            try:
+                for course in courses[rotation:] + courses[:rotation]:
+                    cohorts[course] = heuristic_cohorts(course_availabilities[course], course_facilitators_info(course, cohorts), num_cohorts[course],
+                                                        min_size, max_size, time_block, possible_times, time_budget=local_search_time, should_stop=should_stop)
+                if on_incumbent is not None:
+                    on_incumbent(cohorts, sum(count_placed(c) for c in cohorts.values()), {"local search": True})
+                return cohorts
+            except ValueError:
+                if rotation == len(courses) - 1:
+                    raise
+        return cohorts
+
+    # Find all possible cohorts for each course, with the courses running concurrently in separate processes
+    arguments = [
+        (course_availabilities[course], course_facilitators_info(course, {}), min_size, max_size, time_block, possible_times, deadline)
+        for course in courses
+    ]
+    if len(courses) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(len(courses), os.cpu_count() or 1)) as executor:
+            all_cohorts = list(executor.map(find_all_possible_cohorts, *zip(*arguments)))
+    else:
+        all_cohorts = [find_all_possible_cohorts(*args) for args in arguments]
+
+    # Select the cohorts of all courses together, so that each facilitator's capacity goes to where it is needed
+    def report(selected, value, stats):
+        if on_incumbent is not None:
+            on_incumbent({**cohorts, **selected}, value, stats)
+
+    possible_cohorts = dict(zip(courses, all_cohorts))
+    course_num_cohorts = {course: num_cohorts[course] for course in courses}
+    selected = run_search(lambda stop: iter_best_cohorts_jointly(possible_cohorts, course_num_cohorts, min_size, facilitators_info, deadline, stop,
+                                                                 checkpoint_file=checkpoint_file, resume=resume),
+                          search_time, report, should_stop)
+    cohorts.update(selected or {})
+
+    if local_search_time > 0:
+        from local_search import improve_cohorts
+        improved = False
+        for course in courses:
+            others = {other: cohorts[other] for other in courses if other != course}
+            improved_cohorts = improve_cohorts(cohorts[course], course_availabilities[course], course_facilitators_info(course, others),
+                                               min_size, max_size, time_block, possible_times, time_budget=local_search_time, should_stop=should_stop)
+            improved = improved or improved_cohorts is not cohorts[course]
+            cohorts[course] = improved_cohorts
+        if improved and on_incumbent is not None:
+            on_incumbent(dict(cohorts), sum(count_placed(c) for c in cohorts.values()), {"local search": True})
+    return cohorts
+
+
+# Merged exports for each kind of file, kept between calls to load_export so that only new or changed exports are read again
+export_stores = {}
+
+
+def export_store(file_paths, kind):
+    """
+    Return the ExportStore (see exports.py) holding the merged exports in the list file_paths, reading only the exports that were added or changed.
+    kind: which data the files hold, e.g. "participant" or "facilitator", so that each kind of file keeps its own merged exports.
+    """
+    from exports import ExportStore
+    if kind not in export_stores:
+        export_stores[kind] = ExportStore()
+    export_stores[kind].update(file_paths)
+    return export_stores[kind]
+
+
+def load_export(file_path, kind):
+    """
+    Load a LettuceMeet export, or merge a list of exports into one (see export_store).
+    """
+    if isinstance(file_path, str):
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    return export_store(file_path, kind).to_export()
+
+
+def load_data(params):
+    """
+    Load the participant and facilitator data from the JSON files given in the parameters.
+    Each can be the path to one LettuceMeet export, or a list of paths to exports that are merged into one (see exports.py).
+    """
+
+    # Load participant data from JSON file
+    participant_data = load_export(params["participant_file_path"], "participant")
+
+    # Load facilitator data from JSON file
+    facilitator_data = load_export(params["facilitator_file_path"], "facilitator")
+
+    return participant_data, facilitator_data
+
+
+def load_index(params):
+    """
+    Load the files given in the parameters, as load_data does, and extract the availabilities from them (see index_data).
+    Lists of exports are kept merged in an ExportStore, which also keeps each respondent's availabilities, so only the exports that were added
+    or changed are read and only their respondents' availabilities are worked out again.
+    """
+    def load(file_path, kind):
+        return load_export(file_path, kind) if isinstance(file_path, str) else export_store(file_path, kind)
+
+    return index_data(load(params["participant_file_path"], "participant"), load(params["facilitator_file_path"], "facilitator"))
+
+
+def index_data(participant_data, facilitator_data):
+    """
+    Extract the availabilities from participant and facilitator data that has already been loaded. The index only depends on the data,
+    so it can be kept and used for several runs with different parameters (see form_cohorts_from_index).
+    Either can also be an ExportStore holding several merged exports, whose respondents' availabilities are taken from the store.
+    The facilitators are then placed at the participant poll times on the same weekdays, rather than on the matching dates (see match_dates).
+    Returns a dictionary with the applicants' availabilities from index_participants, the possible times and the facilitators' availabilities.
+    """
+    if isinstance(participant_data, dict):
+        participants, possible_times = index_participants(participant_data)
+    else:
+        possible_times = participant_data.possible_times()
+        participants = list(participant_data.availabilities(possible_times).items())
+
+    if isinstance(participant_data, dict) and isinstance(facilitator_data, dict):
+        facilitators = extract_facilitator_availabilities(facilitator_data, participant_data)
+    elif isinstance(facilitator_data, dict):
+        from exports import reduce_event, place_on_poll_times
+        respondents = reduce_event(facilitator_data['data']['event'])["respondents"]
+        facilitators = {name: place_on_poll_times(intervals, possible_times) for name, (_, intervals) in respondents.items()}
+    else:
+        facilitators = facilitator_data.availabilities(possible_times)
+
+    return {
+        "participants": participants,
+        "possible_times": possible_times,
+        "facilitators": facilitators,
+    }
+
+
+def form_cohorts_from_data(participant_data, facilitator_data, params, progress=None, on_incumbent=None, should_stop=None):
+    """
+    Form the cohorts from participant and facilitator data that has already been loaded. 
+    The parameters are the same as for process_data, and progress is an optional function that is called with a message at each stage.
+    on_incumbent is an optional function that is called with (results, number of participants placed, search statistics) each time
+    better cohorts are found, where the results have the same format as the return value. should_stop is an optional function that
+    returns True to stop the search and keep the best cohorts found so far.
+    """
+    if progress is not None:
+        progress("Extracting availabilities")
+    return form_cohorts_from_index(index_data(participant_data, facilitator_data), params, progress, on_incumbent, should_stop)
+
+
+def form_cohorts_from_index(index, params, progress=None, on_incumbent=None, should_stop=None):
+    """
+    Form the cohorts from the availabilities returned by index_data. The other arguments and the return value are the same as for form_cohorts_from_data.
+    """
+    courses = params.get("courses")
+    num_total_cohorts = params["num_total_cohorts"]
+    min_size = params["min_size"]
+    max_size = params["max_size"]
+    time_block = params["time_block"]
+    facilitator_capacity_course_entries = params["facilitator_capacity_course_entries"]
+    filter_by_course = params["filter_by_course"]
+    local_search_time = params.get("local_search_time", 0)
+    heuristic_mode = params.get("heuristic_mode", False)
+    time_limit = params.get("time_limit")
+    search_time = params.get("search_time", 0)
+    checkpoint_file = params.get("checkpoint_file")
+    resume = params.get("resume", False)
+    diagnostics = params.get("diagnostics", False)
+    deadline = time.time() + time_limit if time_limit else None
+
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    # Parameters written for the earlier two-course version of this file are turned into the course dictionary
+    if courses is None and filter_by_course:
+        courses = {
+            "align": {"name": "Alignment", "applicants": params["alignment_applicants"], "num_cohorts": params["num_align_cohorts"]},
+            "gov": {"name": "Governance", "applicants": params["governance_applicants"], "num_cohorts": params["num_gov_cohorts"]},
+        }
+
+    facilitators_availabilities = index["facilitators"]
+    possible_times = index["possible_times"]
+
+    facilitators_info = {name: [facilitators_availabilities[name], int(facilitator_capacity_course_entries[name][0]), facilitator_courses(facilitator_capacity_course_entries[name][1])] for name in facilitators_availabilities}
+    
+    # Sort the applicants by course, leaving out the ones who aren't available for a whole time block
+    course_applicants = {course: set(courses[course]["applicants"]) for course in courses or {}}
+    availabilities, not_available = group_participants(index["participants"], time_block, course_applicants, filter_by_course)
+
+    report("Forming cohorts")
+    if filter_by_course:
+        course_availabilities, misc_availabilities = availabilities
+        num_cohorts = {course: courses[course]["num_cohorts"] for course in courses}
+
+        def build_result(course_cohorts):
+            not_selected_by_course = {
+                course: set(course_availabilities[course].keys()) - set([name for cohort in course_cohorts[course] for name in cohort[2]])
+                for course in courses
+            }
+            return {
+                'course cohorts': course_cohorts,
+                'course names': {course: courses[course].get("name", course) for course in courses},
+                'not_selected_by_course': not_selected_by_course,
+                'not assigned to a course': misc_availabilities.keys(),
+                'not_available': not_available,
+            }
+
+        def report_incumbent(course_cohorts, value, stats):
+            if on_incumbent is not None:
+                on_incumbent(build_result(course_cohorts), value, stats)
+
+        course_cohorts = form_course_cohorts(course_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times, local_search_time, heuristic_mode, deadline,
+                                             search_time, report_incumbent, should_stop, checkpoint_file, resume)
+        result = build_result(course_cohorts)
+        if diagnostics:
+            from diagnostics import explain_unplaced, explain_without_course
+            report("Explaining why applicants were not placed")
+            result['diagnostics'] = {}
+            for course in courses:
+                # Facilitators who can lead the course, with the capacity that is not used by the other courses
+                course_facilitators_info = {
+                    name: (info[0], info[1] - sum(cohort[3] == name for other in courses if other != course for cohort in course_cohorts[other]))
+                    for name, info in facilitators_info.items() if course in info[2]
+                }
+                course_not_available = [name for name in not_available if name in course_applicants[course]]
+                for name, diagnosis in explain_unplaced(course_cohorts[course], course_availabilities[course], course_facilitators_info, num_cohorts[course],
+                                                        min_size, max_size, time_block, possible_times, course_not_available).items():
+                    result['diagnostics'][name] = dict(diagnosis, course=course)
+
+            # Applicants who are not in any of the courses, whether or not they were available
+            in_a_course = set().union(*course_applicants.values())
+            result['diagnostics'].update(explain_without_course(misc_availabilities, [name for name in not_available if name not in in_a_course]))
+        report("Done")
+        return result
+    else:
+        participants_availabilities = availabilities
+
+        def build_result(best_cohorts):
+            not_selected = set(participants_availabilities.keys()) - set([name for cohort in best_cohorts for name in cohort[2]])
+            return {
+                'misc cohorts': best_cohorts,
+                'not_selected_misc': not_selected,
+                'not_available': not_available,
+            }
+
+        def report_incumbent(best_cohorts, value, stats):
+            if on_incumbent is not None:
+                on_incumbent(build_result(best_cohorts), value, stats)
+
+        best_cohorts = form_cohorts(participants_availabilities, facilitators_info, num_total_cohorts, min_size, max_size, time_block, possible_times, local_search_time, heuristic_mode, deadline,
+                                    search_time, report_incumbent, should_stop, checkpoint_file, resume)
+        result = build_result(best_cohorts)
+        if diagnostics:
+            from diagnostics import explain_unplaced
+            report("Explaining why applicants were not placed")
+            result['diagnostics'] = explain_unplaced(best_cohorts, participants_availabilities, facilitators_info, num_total_cohorts,
+                                                     min_size, max_size, time_block, possible_times, not_available)
+        report("Done")
+        return result
+
+
+def process_data(params, on_incumbent=None, should_stop=None):
+    """
+    Process the data and return the results.
+    
+    Parameters:
+    - participant_file_path: path to the JSON file containing the participant data, or a list of paths to several exports to merge
+    - courses: dictionary mapping each course to a dictionary with its "name", "applicants" and "num_cohorts"
+    - num_total_cohorts: total number of cohorts to form (used when not filtering by course)
+    - min_size: minimum number of participants in a cohort
+    - max_size: maximum number of participants in a cohort
+    - time_block: meeting time block in hours
+    - facilitator_file_path: path to the JSON file containing the facilitator data, or a list of paths to several exports to merge
+    - facilitator_capacity_course_entries: dictionary containing the facilitator's capacity and course, or list of courses
+    - filter_by_course: boolean indicating whether to filter by course or not
+    - local_search_time: seconds spent improving the selected cohorts with a local search (optional, 0 disables it)
+    - heuristic_mode: boolean indicating whether to skip the exact search and only use the local search (optional, for very large polls)
+    - time_limit: seconds after which the search is stopped, keeping the best cohorts so far or raising a TimeoutError if there are none (optional)
+    - search_time: seconds to keep looking for better cohorts after the first ones are found (optional, 0 by default, None searches until the best possible cohorts are found)
+    - checkpoint_file: path to a file where the state of the search is saved regularly, so that it can be resumed after an interruption (optional)
+    - resume: boolean indicating whether to carry on with the search saved in checkpoint_file (optional). The file is ignored if it was
+      saved with different data or parameters.
+    - diagnostics: boolean indicating whether to explain why each applicant who was not placed was left out (optional). The explanations are
+      returned under 'diagnostics', mapping each applicant to the dictionary returned for them by diagnostics.explain_unplaced, with their course
+      added under "course" when filtering by course (None for the applicants who are not assigned to a course).
+
+    on_incumbent and should_stop are passed on to form_cohorts_from_index, to follow the search as it finds better cohorts and to stop it early.
+
+    """
+
+    try:
+        return form_cohorts_from_index(load_index(params), params, on_incumbent=on_incumbent, should_stop=should_stop)
+
+    except Exception as e:
+        raise e
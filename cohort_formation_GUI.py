@@ -5,6 +5,8 @@ from tkinter import filedialog, messagebox, scrolledtext
 import data_processing_for_GUI as data_processing
 import json
 import os
+import queue
+import threading
 
 # Variables to store file paths and facilitator capacity entries
 file_path = ""
@@ -13,15 +15,23 @@ facilitator_capacity_entries = {}
 participant_file_label = None
 facilitator_file_label = None
 
+# Queue for results sent from the search thread, and event to tell the search to stop
+search_updates = queue.Queue()
+stop_event = threading.Event()
+
+# Address and id of the job running on the job server, if any, so that Stop can stop it too
+server_job = None
+
 
 def load_file():
-    """Function to load participant JSON file"""
+    """Function to load participant JSON file. Several files can be selected, and they are merged into one poll."""
 
     global file_path, participant_file_label
-    file_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
-    if file_path:
-        messagebox.showinfo("File Loaded", "Participant JSON file loaded successfully.")
-        participant_file_label.config(text="Loaded: " + os.path.basename(file_path))
+    file_paths = filedialog.askopenfilenames(filetypes=[("JSON files", "*.json")])
+    if file_paths:
+        file_path = file_paths[0] if len(file_paths) == 1 else list(file_paths)
+        messagebox.showinfo("File Loaded", "Participant JSON file loaded successfully." if len(file_paths) == 1 else f"{len(file_paths)} participant JSON files loaded successfully.")
+        participant_file_label.config(text="Loaded: " + ", ".join(os.path.basename(path) for path in file_paths))
 
 
 def load_facilitator_file():
@@ -53,8 +63,81 @@ def display_facilitator_capacity_inputs():
         messagebox.showerror("Error", f"Failed to load facilitator data: {e}")
 
 
+def run_on_server(server_address, num_cohorts, min_size, max_size, time_block, capacities, local_search_time, heuristic_mode, search_time, diagnostics=False,
+                  checkpoint_file=None, resume=False):
+    """
+    Function to form the cohorts on a job server, returning the results in the same format as data_processing.process_data.
+    The server's progress messages are sent to the search_updates queue, and the job is stopped when Stop is pressed.
+    """
+    global server_job
+    import job_server
+    params = {
+        "participant_file_path": file_path,
+        "facilitator_file_path": facilitator_file_path,
+        "num_total_cohorts": num_cohorts,
+        "min_size": min_size,
+        "max_size": max_size,
+        "time_block": time_block,
+        "facilitator_capacity_course_entries": {name: [capacity, ""] for name, capacity in capacities.items()},
+        "filter_by_course": False,
+        "local_search_time": local_search_time,
+        "heuristic_mode": heuristic_mode,
+        "search_time": search_time,
+        "diagnostics": diagnostics,
+        "checkpoint_file": checkpoint_file,
+        "resume": resume,
+    }
+    job_id = job_server.submit_job(server_address, params)
+    server_job = (server_address, job_id)
+    try:
+        # Stop may have been pressed while the job was being submitted
+        if stop_event.is_set():
+            job_server.stop_job(server_address, job_id)
+        data = job_server.wait_for_job(server_address, job_id, on_progress=lambda message: search_updates.put(("progress", message, None, None)))
+    finally:
+        server_job = None
+    results = {
+        "cohorts": data["misc cohorts"],
+        "not_selected": data["not_selected_misc"],
+        "not_available": data["not_available"],
+    }
+    if "diagnostics" in data:
+        results["diagnostics"] = data["diagnostics"]
+    return results
+
+
+def show_results(data, time_block, header=None):
+    """Function to display the formed cohorts in the result text box"""
+    result_text.delete('1.0', tk.END)
+    if header:
+        result_text.insert(tk.END, header + "\n\n", 'bold')
+    for i, cohort in enumerate(data["cohorts"], start=1):
+        start, end, participants, facilitator = cohort
+        start_str = start.strftime('%A, %H:%M')
+        end_str = end.strftime('%H:%M')
+        result_text.insert(tk.END, f"Cohort {i}, {start_str} to {end_str}\n", 'bold')
+        result_text.insert(tk.END, ", ".join(participants) + f"\n")
+        result_text.insert(tk.END, f"Facilitator: ", 'bold')
+        result_text.insert(tk.END, f"{facilitator}\n\n")
+    if data["not_selected"]:
+        result_text.insert(tk.END, "Applicants not included in cohorts:\n", 'bold')
+        for applicant in data["not_selected"]:
+            result_text.insert(tk.END, f"{applicant}\n")
+    if data["not_available"]:
+        result_text.insert(tk.END, f"\nApplicants skipped due to low availability (available less than {time_block} hours consecutively):\n", 'bold')
+        for applicant in data["not_available"]:
+            result_text.insert(tk.END, f"{applicant}\n")
+    if data.get("diagnostics"):
+        from diagnostics import describe_diagnosis
+        result_text.insert(tk.END, "\nWhy applicants were not placed:\n", 'bold')
+        for applicant, diagnosis in data["diagnostics"].items():
+            result_text.insert(tk.END, f"{applicant}: ", 'bold')
+            result_text.insert(tk.END, describe_diagnosis(diagnosis) + "\n")
+    result_text.tag_configure('bold', font=('Arial', 10, 'bold'))
+
+
 def run_analysis():
-    """Function to run the cohort analysis"""
+    """Function to run the cohort analysis. The search runs in the background, and the best cohorts so far are shown as they are found."""
     global file_path, facilitator_file_path
     if not file_path:
         messagebox.showwarning("Warning", "Please load a JSON file first.")
@@ -64,74 +147,158 @@ def run_analysis():
         min_size = int(min_size_entry.get())
         max_size = int(max_size_entry.get())
         time_block = float(time_block_entry.get())
-        data = data_processing.process_data(file_path, num_cohorts, min_size, max_size, time_block, facilitator_file_path, facilitator_capacity_entries)
-        result_text.delete('1.0', tk.END)
-        for i, cohort in enumerate(data["cohorts"], start=1):
-            start, end, participants, facilitator = cohort
-            start_str = start.strftime('%A, %H:%M')
-            end_str = end.strftime('%H:%M')
-            result_text.insert(tk.END, f"Cohort {i}, {start_str} to {end_str}\n", 'bold')
-            result_text.insert(tk.END, ", ".join(participants) + f"\n")
-            result_text.insert(tk.END, f"Facilitator: ", 'bold')
-            result_text.insert(tk.END, f"{facilitator}\n\n")
-        if data["not_selected"]:
-            result_text.insert(tk.END, "Applicants not included in cohorts:\n", 'bold')
-            for applicant in data["not_selected"]:
-                result_text.insert(tk.END, f"{applicant}\n")
-        if data["not_available"]:
-            result_text.insert(tk.END, f"\nApplicants skipped due to low availability (available less than {time_block} hours consecutively):\n", 'bold')
-            for applicant in data["not_available"]:
-                result_text.insert(tk.END, f"{applicant}\n")
-        result_text.tag_configure('bold', font=('Arial', 10, 'bold'))
+        local_search_time = float(local_search_time_entry.get() or 0)
+        search_time = float(search_time_entry.get() or 0)
+        heuristic_mode = heuristic_mode_var.get()
+        save_search = save_search_var.get()
+        resume = resume_var.get()
+        diagnostics = diagnostics_var.get()
+        server_address = server_address_entry.get().strip()
+        capacities = {name: int(entry.get()) for name, entry in facilitator_capacity_entries.items()}
     except ValueError as e:
         messagebox.showerror("Error", str(e))
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+        return
+
+    def report_incumbent(data, value, stats):
+        search_updates.put(("incumbent", data, value, stats))
+
+    # If asked, the state of the search is saved next to the participant file, so that it can be resumed if the window is closed
+    checkpoint_file = None
+    if save_search or resume:
+        checkpoint_file = os.path.splitext(file_path if isinstance(file_path, str) else file_path[0])[0] + "_search_checkpoint.json"
+
+    # Tk widgets can only be used from the main thread, so the search sends its results back through the search_updates queue
+    def search():
+        try:
+            if server_address:
+                data = run_on_server(server_address, num_cohorts, min_size, max_size, time_block, capacities, local_search_time, heuristic_mode, search_time,
+                                     diagnostics, checkpoint_file, resume)
+            else:
+                data = data_processing.process_data(file_path, num_cohorts, min_size, max_size, time_block, facilitator_file_path, capacities,
+                                                    local_search_time, heuristic_mode, search_time, report_incumbent, stop_event.is_set,
+                                                    checkpoint_file, resume, diagnostics)
+            search_updates.put(("done", data, None, None))
+        except Exception as e:
+            search_updates.put(("error", e, None, None))
+
+    stop_event.clear()
+    run_button.config(state=tk.DISABLED)
+    stop_button.config(state=tk.NORMAL)
+    result_text.delete('1.0', tk.END)
+    result_text.insert(tk.END, "Searching for cohorts...\n")
+    threading.Thread(target=search, daemon=True).start()
+    app.after(100, check_search_updates, time_block)
+
+
+def check_search_updates(time_block):
+    """Function to show the results sent by the search, checked every 100 ms while the search runs"""
+    try:
+        while True:
+            kind, data, value, stats = search_updates.get_nowait()
+            if kind == "progress":
+                result_text.insert(tk.END, data + "\n")
+            elif kind == "incumbent":
+                if stats.get("local search"):
+                    header = f"Best cohorts so far: {value} applicants placed (after the local search)"
+                else:
+                    header = f"Best cohorts so far: {value} applicants placed (after {stats['elapsed']:.1f} s). Press Stop to keep these."
+                show_results(data, time_block, header)
+            else:
+                if kind == "done":
+                    show_results(data, time_block)
+                else:
+                    messagebox.showerror("Error", str(data))
+                run_button.config(state=tk.NORMAL)
+                stop_button.config(state=tk.DISABLED)
+                return
+    except queue.Empty:
+        pass
+    app.after(100, check_search_updates, time_block)
+
+
+def stop_search():
+    """Function to stop the search and keep the best cohorts found so far"""
+    stop_event.set()
+    if server_job is not None:
+        # The request is sent from another thread, so that the window doesn't wait for the server
+        import job_server
+        threading.Thread(target=job_server.stop_job, args=server_job, daemon=True).start()
+
+# GUI setup. This is only run when the file is started directly, so that the local search worker processes don't open windows of their own.
+if __name__ == "__main__":
+    app = tk.Tk()
+    app.title("Cohort Generator Tool")
+
+    # File upload buttons and labels
+    load_button = tk.Button(app, text="Load Participant JSON File", command=load_file)
+    load_button.pack()
+    participant_file_label = tk.Label(app, text="No file loaded")
+    participant_file_label.pack()
+
+    load_facilitator_button = tk.Button(app, text="Load Facilitator JSON File", command=load_facilitator_file)
+    load_facilitator_button.pack()
+    facilitator_file_label = tk.Label(app, text="No file loaded")
+    facilitator_file_label.pack()
+
+    # Input fields for analysis parameters
+    tk.Label(app, text="Number of Cohorts:").pack()
+    num_cohorts_entry = tk.Entry(app)
+    num_cohorts_entry.pack()
+
+    tk.Label(app, text="Minimum Size:").pack()
+    min_size_entry = tk.Entry(app)
+    min_size_entry.pack()
+
+    tk.Label(app, text="Maximum Size:").pack()
+    max_size_entry = tk.Entry(app)
+    max_size_entry.pack()
+
+    tk.Label(app, text="Time Block (hours):").pack()
+    time_block_entry = tk.Entry(app)
+    time_block_entry.pack()
+
+    tk.Label(app, text="Local Search Time (seconds):").pack()
+    local_search_time_entry = tk.Entry(app)
+    local_search_time_entry.insert(0, "5")
+    local_search_time_entry.pack()
 
-# GUI setup
-app = tk.Tk()
-app.title("Cohort Generator Tool")
+    tk.Label(app, text="Search Time (seconds):").pack()
+    search_time_entry = tk.Entry(app)
+    search_time_entry.insert(0, "30")
+    search_time_entry.pack()
 
-# File upload buttons and labels
-load_button = tk.Button(app, text="Load Participant JSON File", command=load_file)
-load_button.pack()
-participant_file_label = tk.Label(app, text="No file loaded")
-participant_file_label.pack()
+    heuristic_mode_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="Fast heuristic mode (for very large polls)", variable=heuristic_mode_var).pack()
 
-load_facilitator_button = tk.Button(app, text="Load Facilitator JSON File", command=load_facilitator_file)
-load_facilitator_button.pack()
-facilitator_file_label = tk.Label(app, text="No file loaded")
-facilitator_file_label.pack()
+    save_search_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="Save the search so that it can be resumed later", variable=save_search_var).pack()
 
-# Input fields for analysis parameters
-tk.Label(app, text="Number of Cohorts:").pack()
-num_cohorts_entry = tk.Entry(app)
-num_cohorts_entry.pack()
+    resume_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="Resume the previous search with these settings", variable=resume_var).pack()
 
-tk.Label(app, text="Minimum Size:").pack()
-min_size_entry = tk.Entry(app)
-min_size_entry.pack()
+    diagnostics_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="Explain why applicants were not placed", variable=diagnostics_var).pack()
 
-tk.Label(app, text="Maximum Size:").pack()
-max_size_entry = tk.Entry(app)
-max_size_entry.pack()
+    tk.Label(app, text="Job Server (optional, e.g. http://127.0.0.1:8765):").pack()
+    server_address_entry = tk.Entry(app)
+    server_address_entry.pack()
 
-tk.Label(app, text="Time Block (hours):").pack()
-time_block_entry = tk.Entry(app)
-time_block_entry.pack()
+    # Frame for displaying facilitator capacity inputs
+    facilitator_frame = tk.Frame(app)
+    facilitator_frame.pack()
 
-# Frame for displaying facilitator capacity inputs
-facilitator_frame = tk.Frame(app)
-facilitator_frame.pack()
+    # Button to initiate analysis
+    run_button = tk.Button(app, text="Generate cohorts", command=run_analysis)
+    run_button.pack()
 
-# Button to initiate analysis
-run_button = tk.Button(app, text="Generate cohorts", command=run_analysis)
-run_button.pack()
+    # Button to stop the search and keep the best cohorts found so far
+    stop_button = tk.Button(app, text="Stop", command=stop_search, state=tk.DISABLED)
+    stop_button.pack()
 
-# Text box for displaying analysis results
-result_text = scrolledtext.ScrolledText(app, wrap=tk.WORD)
-result_text.pack(expand=True, fill='both')
+    # Text box for displaying analysis results
+    result_text = scrolledtext.ScrolledText(app, wrap=tk.WORD)
+    result_text.pack(expand=True, fill='both')
 
-# Start the GUI event loop
-app.mainloop()
+    # Start the GUI event loop
+    app.mainloop()
 
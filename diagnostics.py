@@ -0,0 +1,113 @@
+# This file contains the diagnostics that explain why applicants were not placed in a cohort.
+# It is called by the other files and you do not need to modify or run it.
+
+from local_search import build_slot_index
+
+# The reasons an applicant can be left out, in the order they are reported
+SIZE_CAP = "size cap"
+NO_FACILITATOR = "no facilitator"
+COHORT_LIMIT = "cohort limit"
+TOO_FEW_APPLICANTS = "too few applicants"
+NO_MATCHING_WINDOW = "no matching window"
+NO_COURSE = "not assigned to a course"
+BLOCKERS = (SIZE_CAP, NO_FACILITATOR, COHORT_LIMIT, TOO_FEW_APPLICANTS, NO_MATCHING_WINDOW, NO_COURSE)
+
+
+def explain_unplaced(cohorts, participants_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times, not_available=()):
+    """
+    Explain why each applicant who is not in one of the cohorts was left out. All applicants are handled together in one pass over the slot index.
+    cohorts: the formed cohorts, as (start, end, participants, facilitator) tuples
+    facilitators_info: dictionary mapping each facilitator to their availabilities and capacity, as the first two items.
+    The capacity should not count cohorts formed for other courses, while the cohorts given here are taken off by this function.
+    not_available: names of the applicants who were skipped for low availability, who are explained as having no matching window
+
+    Returns a dictionary mapping each applicant left out to a dictionary with:
+    - "windows": the (start, end) meeting times the applicant is available for
+    - "joinable": the numbers (starting at 1) of the formed cohorts at one of those times that still have room
+    - "blockers": the reasons the applicant could not be placed at each of those times, in the order of BLOCKERS.
+      A formed cohort at the time was full (size cap), no facilitator with capacity left was available to start a new cohort (no facilitator),
+      the requested number of cohorts was already formed (cohort limit), fewer than min_size applicants left out were available (too few applicants),
+      or the applicant isn't available for a whole time block (no matching window).
+    """
+    placed = {name for cohort in cohorts for name in cohort[2]}
+    unplaced = {name: availability for name, availability in participants_availabilities.items() if name not in placed}
+
+    # Facilitators who can still start a new cohort, with the capacity left after the formed cohorts
+    capacity_left = {name: info[1] - sum(cohort[3] == name for cohort in cohorts) for name, info in facilitators_info.items()}
+    free_facilitators_info = {name: (info[0], capacity_left[name]) for name, info in facilitators_info.items()}
+    slots = build_slot_index(unplaced, free_facilitators_info, time_block, possible_times)
+
+    # Formed cohorts by meeting time, numbered as they are shown
+    cohorts_by_time = {}
+    for number, cohort in enumerate(cohorts, start=1):
+        cohorts_by_time.setdefault((cohort[0], cohort[1]), []).append((number, cohort))
+
+    diagnostics = {name: {"windows": [], "joinable": [], "blockers": set()} for name in unplaced}
+    for start, end, participants, facilitators in slots:
+        if not participants:
+            continue
+        joinable = []
+        blockers = set()
+        formed = cohorts_by_time.get((start, end), [])
+        for number, cohort in formed:
+            if len(cohort[2]) < max_size:
+                joinable.append(number)
+            else:
+                blockers.add(SIZE_CAP)
+        if not facilitators:
+            blockers.add(NO_FACILITATOR)
+        elif len(cohorts) >= num_cohorts:
+            blockers.add(COHORT_LIMIT)
+        elif len(participants) < min_size:
+            blockers.add(TOO_FEW_APPLICANTS)
+
+        for name in participants:
+            diagnosis = diagnostics[name]
+            diagnosis["windows"].append((start, end))
+            diagnosis["joinable"].extend(joinable)
+            diagnosis["blockers"] |= blockers
+
+    for diagnosis in diagnostics.values():
+        if not diagnosis["windows"]:
+            diagnosis["blockers"].add(NO_MATCHING_WINDOW)
+        diagnosis["joinable"] = sorted(set(diagnosis["joinable"]))
+        diagnosis["blockers"] = [blocker for blocker in BLOCKERS if blocker in diagnosis["blockers"]]
+    for name in not_available:
+        diagnostics[name] = {"windows": [], "joinable": [], "blockers": [NO_MATCHING_WINDOW]}
+    return diagnostics
+
+
+def explain_without_course(names, not_available=()):
+    """
+    Explain why applicants who are not in any of the courses were left out, when the cohorts are formed by course.
+    names: applicants who are available for a whole time block but not assigned to a course
+    not_available: applicants who are not assigned to a course and were also skipped for low availability
+    Returns a dictionary in the same format as explain_unplaced, with the course set to None.
+    """
+    diagnostics = {name: {"windows": [], "joinable": [], "blockers": [NO_COURSE], "course": None} for name in names}
+    for name in not_available:
+        diagnostics[name] = {"windows": [], "joinable": [], "blockers": [NO_MATCHING_WINDOW, NO_COURSE], "course": None}
+    return diagnostics
+
+
+def describe_diagnosis(diagnosis, cohort_name="Cohort", max_windows=3):
+    """
+    Describe a diagnosis from explain_unplaced in a sentence, e.g. for printing next to the applicant's name.
+    cohort_name: how the cohorts are named, e.g. "Alignment cohort"
+    """
+    windows = diagnosis["windows"]
+    if not windows:
+        if NO_MATCHING_WINDOW not in diagnosis["blockers"]:
+            return "not assigned to a course."
+        if NO_COURSE in diagnosis["blockers"]:
+            return "not available for a whole time block at any of the poll times, and not assigned to a course."
+        return "not available for a whole time block at any of the poll times."
+    times = "; ".join(f"{start.strftime('%A, %H:%M')} to {end.strftime('%H:%M')}" for start, end in windows[:max_windows])
+    if len(windows) > max_windows:
+        times += f" and {len(windows) - max_windows} more"
+    text = f"available {times}."
+    if diagnosis["joinable"]:
+        text += " Could join " + ", ".join(f"{cohort_name} {number}" for number in diagnosis["joinable"]) + "."
+    if diagnosis["blockers"]:
+        text += " Blocked by: " + ", ".join(diagnosis["blockers"]) + "."
+    return text
@@ -0,0 +1,214 @@
+# This file contains the code for merging several LettuceMeet exports (e.g. one poll per city or per week) into one.
+# It is used by the other files and you do not need to modify or run it.
+
+import json
+import os
+from datetime import datetime, timedelta
+from intervals import normalize_intervals
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+
+
+def week_minute(moment):
+    """Return the number of minutes from the start of the week (Monday 00:00) to the given datetime."""
+    return moment.weekday() * DAY_MINUTES + moment.hour * 60 + moment.minute
+
+
+def day_minute(time_text):
+    """Return the number of minutes from midnight to a LettuceMeet poll time such as "09:00:00.000Z"."""
+    moment = datetime.strptime(time_text, "%H:%M:%S.%fZ")
+    return moment.hour * 60 + moment.minute
+
+
+def read_export(file_path):
+    """Read one LettuceMeet export and reduce it to what is needed to merge it with others (see reduce_event)."""
+    with open(file_path, 'r') as file:
+        return reduce_event(json.load(file)['data']['event'])
+
+
+def reduce_event(event):
+    """
+    Reduce the event of a LettuceMeet export to what is needed to merge it with others: the poll's weekdays and times,
+    and each respondent's availabilities on the week grid, as (start, end) minutes from the start of the week.
+    If a name responded more than once, the response with the latest updatedAt is kept.
+    """
+    # The poll times, with a poll that ends at or before the time it starts running into the next day
+    start = day_minute(event['pollStartTime'])
+    end = day_minute(event['pollEndTime'])
+    if end <= start:
+        end += DAY_MINUTES
+    dates = [datetime.strptime(date, "%Y-%m-%d") for date in event['pollDates']]
+
+    respondents = {}
+    for response in event['pollResponses']:
+        name = response['user']['name']
+        updated_at = response.get('updatedAt') or ""
+        intervals = []
+        for availability in response['availabilities']:
+            availability_start = datetime.strptime(availability['start'], TIME_FORMAT)
+            availability_end = datetime.strptime(availability['end'], TIME_FORMAT)
+            start_minute = week_minute(availability_start)
+            end_minute = start_minute + int((availability_end - availability_start).total_seconds() // 60)
+            # Availabilities that run past the end of the week carry on at the start of it
+            if end_minute > WEEK_MINUTES:
+                intervals += [(start_minute, WEEK_MINUTES), (0, end_minute - WEEK_MINUTES)]
+            else:
+                intervals.append((start_minute, end_minute))
+        if name not in respondents or updated_at >= respondents[name][0]:
+            respondents[name] = (updated_at, normalize_intervals(intervals))
+
+    return {
+        "title": event.get('title', ""),
+        "weekdays": {date.weekday() for date in dates},
+        "first_date": min(dates),
+        "start": start,
+        "end": end,
+        "respondents": respondents,
+    }
+
+
+def place_on_poll_times(intervals, possible_times):
+    """
+    Place availabilities on the week grid at the poll times on the same weekdays, clipped to the poll times.
+    A poll time that runs past the end of the week (e.g. Sunday evening in UTC) carries on with the availabilities at the start of it.
+    intervals: (start, end) minutes from the start of the week, as kept by ExportStore
+    possible_times: (start, end) datetimes of the poll on each poll date
+    Returns an Availability.
+    """
+    placed = []
+    for poll_start, poll_end in possible_times:
+        monday = datetime(poll_start.year, poll_start.month, poll_start.day) - timedelta(days=poll_start.weekday())
+        first = (poll_start - monday) // timedelta(minutes=1)
+        last = (poll_end - monday) // timedelta(minutes=1)
+        for start, end in intervals:
+            for shift in (0, WEEK_MINUTES):
+                clipped_start, clipped_end = max(start + shift, first), min(end + shift, last)
+                if clipped_start < clipped_end:
+                    placed.append((monday + timedelta(minutes=clipped_start), monday + timedelta(minutes=clipped_end)))
+    return normalize_intervals(placed)
+
+
+class ExportStore:
+    """
+    Several LettuceMeet exports merged into one, on a grid of weekdays and minutes (in UTC, like the exports), so that polls run in different weeks line up.
+    Respondents who appear in more than one export are kept once, with the response with the latest updatedAt (or from the export added last, if they are the same).
+
+    The store keeps each export it has read, and the merged respondents. Keep using the same store to only read the exports that were added or changed:
+    adding an export to the end of the list only merges that export, and other changes merge again the exports already read, without reading them again.
+    It also keeps each respondent's availabilities at the poll times (see availabilities), which are only worked out again for the respondents that changed.
+    """
+
+    def __init__(self):
+        self.exports = {}
+        self.file_paths = []
+        self.respondents = {}
+        self.placed = {}
+        self.placed_times = None
+        self.changed_names = set()
+
+    def merge(self, file_path):
+        """Merge an export that has already been read into the combined respondents."""
+        position = len(self.file_paths)
+        for name, (updated_at, intervals) in self.exports[file_path][1]["respondents"].items():
+            if name not in self.respondents or (updated_at, position) >= self.respondents[name][:2]:
+                self.respondents[name] = (updated_at, position, intervals)
+                self.changed_names.add(name)
+        self.file_paths.append(file_path)
+
+    def update(self, file_paths):
+        """Make the store hold the exports in file_paths, in that order, reading only the exports that are new or have changed since they were read."""
+        file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+        for file_path in set(self.exports) - set(file_paths):
+            del self.exports[file_path]
+        changed = set()
+        for file_path in file_paths:
+            modified = os.path.getmtime(file_path)
+            if file_path not in self.exports or self.exports[file_path][0] != modified:
+                self.exports[file_path] = (modified, read_export(file_path))
+                changed.add(file_path)
+
+        if file_paths[:len(self.file_paths)] != self.file_paths or changed & set(self.file_paths):
+            # Exports were removed, reordered or changed, so the respondents are merged again
+            self.changed_names.update(self.respondents)
+            self.file_paths = []
+            self.respondents = {}
+        for file_path in file_paths[len(self.file_paths):]:
+            self.merge(file_path)
+
+    def poll(self):
+        """
+        Return the merged poll as (polls, Monday of its week, start minute, end minute, weekdays).
+        The poll covers every weekday of the exports, from the earliest start time to the latest end time, in the week of the earliest poll date.
+        """
+        polls = [self.exports[file_path][1] for file_path in self.file_paths]
+        if not polls:
+            raise ValueError("No LettuceMeet exports were given.")
+        start = min(poll["start"] for poll in polls)
+        end = min(max(poll["end"] for poll in polls), start + DAY_MINUTES)
+        first_date = min(poll["first_date"] for poll in polls)
+        monday = first_date - timedelta(days=first_date.weekday())
+        weekdays = sorted(set().union(*(poll["weekdays"] for poll in polls)))
+        return polls, monday, start, end, weekdays
+
+    def possible_times(self):
+        """Return the start and end of the merged poll on each poll date, as cohort_engine.get_possible_times does for one export."""
+        _, monday, start, end, weekdays = self.poll()
+        return [(monday + timedelta(days=weekday, minutes=start), monday + timedelta(days=weekday, minutes=end)) for weekday in weekdays]
+
+    def availabilities(self, possible_times):
+        """
+        Return each merged respondent's availabilities at the given poll times (see place_on_poll_times), in the order of the respondents.
+        They are kept, and only placed again for the respondents that changed since the last call, unless the poll times are different.
+        """
+        if possible_times != self.placed_times:
+            self.placed = {}
+            self.placed_times = possible_times
+            self.changed_names.update(self.respondents)
+        for name in self.changed_names:
+            if name in self.respondents:
+                self.placed[name] = place_on_poll_times(self.respondents[name][2], possible_times)
+            else:
+                self.placed.pop(name, None)
+        self.changed_names = set()
+        return {name: self.placed[name] for name in self.respondents}
+
+    def to_export(self):
+        """
+        Return the merged exports in the same format as a single LettuceMeet export, so they can be used in place of one.
+        The poll covers the times returned by poll.
+        """
+        polls, monday, start, end, weekdays = self.poll()
+
+        def time_text(minute):
+            return (monday + timedelta(minutes=minute)).strftime(TIME_FORMAT)
+
+        return {"data": {"event": {
+            "title": " + ".join(poll["title"] for poll in polls),
+            "pollStartTime": time_text(start)[11:],
+            "pollEndTime": time_text(end % DAY_MINUTES)[11:],
+            "pollDates": [(monday + timedelta(days=weekday)).strftime("%Y-%m-%d") for weekday in weekdays],
+            "pollResponses": [
+                {
+                    "user": {"name": name},
+                    "updatedAt": updated_at or None,
+                    "availabilities": [{"start": time_text(interval_start), "end": time_text(interval_end)} for interval_start, interval_end in intervals],
+                }
+                for name, (updated_at, _, intervals) in self.respondents.items()
+            ],
+        }}}
+
+
+def load_export(file_path, store=None):
+    """
+    Load LettuceMeet data from the path to one export, which is returned as it is, or from a list of paths to exports, which are merged.
+    store: the ExportStore used to merge a list of exports. Pass the same store each time to only read the exports that were added or changed.
+    """
+    if isinstance(file_path, (str, os.PathLike)):
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    if store is None:
+        store = ExportStore()
+    store.update(file_path)
+    return store.to_export()
@@ -0,0 +1,53 @@
+# This file contains helpers for working with availability intervals. It is used by the other files and you do not need to modify or run it.
+
+from bisect import bisect_right
+from datetime import timedelta
+
+
+class Availability(tuple):
+    """
+    A person's availability, as a sorted tuple of (start, end) tuples that neither overlap nor touch.
+    It can be used like any other sequence of intervals, and covers() checks if a time span is available with a binary search.
+    It can't be changed once created, so that the start times used by covers() always match the intervals.
+    Create it with normalize_intervals, which sorts and merges the intervals first.
+    """
+
+    def __new__(cls, intervals=()):
+        self = super().__new__(cls, intervals)
+        self.starts = tuple(start for start, _ in self)
+        return self
+
+    def covers(self, start, end):
+        """Check if the whole time span from start to end is inside one of the intervals."""
+        index = bisect_right(self.starts, start) - 1
+        return index >= 0 and self[index][1] >= end
+
+    def longest(self):
+        """Return the length of the longest interval."""
+        return max((end - start for start, end in self), default=timedelta(0))
+
+
+def normalize_intervals(intervals, window=None):
+    """
+    Sort and merge (start, end) intervals, so that overlapping and adjacent intervals become a single interval.
+    window: optional list of (start, end) intervals (e.g. the poll days) to clip the intervals to
+    Returns an Availability.
+    """
+    if window is not None:
+        intervals = [
+            (max(start, window_start), min(end, window_end))
+            for start, end in intervals
+            for window_start, window_end in window
+            if start < window_end and end > window_start
+        ]
+
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return Availability(merged)
@@ -0,0 +1,508 @@
+# This file contains an optional local job server for forming cohorts. It keeps the loaded LettuceMeet files, and the availabilities extracted from them, in memory,
+# so that several people forming cohorts from the same exports don't each pay for loading them again.
+#
+# Start the server with `python job_server.py` (or `python job_server.py --unix /tmp/cohorts.sock` for a Unix socket),
+# and set server_address in cohort_formation_noGui.py, or the "Job Server" field in the GUI, to send the work to it.
+# The server only listens on this computer and never needs internet access.
+
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime
+from queue import Empty
+from urllib.parse import urlparse
+
+import cohort_engine
+from exports import ExportStore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Parameters that hold file paths. The client makes them absolute, since the server may run from another directory.
+FILE_PARAMETERS = ("participant_file_path", "facilitator_file_path")
+
+# Seconds a job may run past its time limit before its process is stopped
+TIME_LIMIT_GRACE = 30
+
+# Number of finished jobs whose results are kept, to answer identical jobs without running them again
+MAX_FINISHED_JOBS = 100
+
+
+def encode_result(value):
+    """Convert a result dictionary to something that can be written as JSON. Datetimes are kept as {"$datetime": ...} objects."""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: encode_result(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return [encode_result(item) for item in sorted(value)]
+    if isinstance(value, (list, tuple)) or type(value).__name__ == "dict_keys":
+        return [encode_result(item) for item in value]
+    return value
+
+
+def decode_result(value):
+    """Turn a result written by encode_result back into a dictionary with datetimes, as returned by process_data."""
+    if isinstance(value, dict):
+        if set(value) == {"$datetime"}:
+            return datetime.fromisoformat(value["$datetime"])
+        return {key: decode_result(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_result(item) for item in value]
+    return value
+
+
+def run_job(index, params, messages, stop=None):
+    """
+    Form the cohorts for one job from the availabilities extracted by cohort_engine.index_data. This runs in its own process,
+    and sends ("progress", message) tuples through the queue, followed by ("done", result, whether the search finished before the time limit)
+    or ("timed out", error) or ("failed", error).
+    stop: optional multiprocessing.Event that is set to stop the search and keep the best cohorts found so far
+    """
+    # The job gets its own process group, so that stopping it also stops the processes it starts (e.g. for the local search)
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    def report_incumbent(data, value, stats):
+        messages.put(("progress", f"Found cohorts placing {value} applicants"))
+
+    started = time.time()
+    try:
+        result = cohort_engine.form_cohorts_from_index(index, params, progress=lambda message: messages.put(("progress", message)), on_incumbent=report_incumbent,
+                                                       should_stop=stop.is_set if stop is not None else None)
+    except TimeoutError as e:
+        messages.put(("timed out", str(e)))
+    except Exception as e:
+        messages.put(("failed", str(e)))
+    else:
+        # At the time limit, or when stopped, the search keeps the best cohorts so far, which another run could improve on
+        time_limit = params.get("time_limit")
+        complete = (stop is None or not stop.is_set()) and (not time_limit or time.time() - started < time_limit)
+        messages.put(("done", encode_result(result), complete))
+
+
+def stop_process(process):
+    """Stop a job's process, and the processes it started."""
+    try:
+        # The job's process group is stopped even if the job has finished, in case it left processes behind
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        # Either there are no process groups (Windows), or the job was stopped before it could start its own
+        if process.is_alive():
+            process.kill()
+    process.join()
+
+
+class JobServer:
+    """
+    Keeps the loaded polls, and the availabilities extracted from them, in memory and runs the submitted jobs, each in its own process.
+    Each job is a parameter dictionary for cohort_engine.process_data, with an optional "time_limit" in seconds.
+    """
+
+    def __init__(self, workers=None, default_time_limit=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.default_time_limit = default_time_limit
+        self.polls = {}
+        self.exports = {key: ExportStore() for key in FILE_PARAMETERS}
+        self.indexes = {}
+        self.jobs = {}
+        self.finished_jobs = {}
+        self.job_ids = itertools.count(1)
+        self.queue = None
+        self.processes = set()
+
+        # The files are loaded in threads, so that the server keeps answering while they load. The lock keeps them to one at a time.
+        self.load_lock = threading.Lock()
+
+    def load_poll(self, path):
+        """Load a LettuceMeet JSON file, reusing the loaded copy as long as the file hasn't changed."""
+        path = os.path.abspath(path)
+        modified = os.path.getmtime(path)
+        if path not in self.polls or self.polls[path][0] != modified:
+            with open(path, 'r') as file:
+                self.polls[path] = (modified, json.load(file))
+        return self.polls[path][1]
+
+    def modified_times(self, params, key):
+        """Return when the files of one of the FILE_PARAMETERS were last modified, reading the files that are new or have changed."""
+        if isinstance(params[key], str):
+            self.load_poll(params[key])
+            return self.polls[os.path.abspath(params[key])][0]
+        self.exports[key].update(params[key])
+        return [self.exports[key].exports[os.path.abspath(path)][0] for path in params[key]]
+
+    def load_index(self, params):
+        """
+        Return the availabilities extracted from the files of a job (see cohort_engine.index_data). They are extracted once
+        for each combination of files, and extracted again only when one of the files has changed.
+        Lists of files are merged in the ExportStore kept for each parameter, so a list with a file added only needs that file to be read,
+        and only the availabilities of its respondents to be worked out.
+        """
+        files = json.dumps([params[key] for key in FILE_PARAMETERS])
+        modified = [self.modified_times(params, key) for key in FILE_PARAMETERS]
+        if files not in self.indexes or self.indexes[files][0] != modified:
+            data = [self.load_poll(params[key]) if isinstance(params[key], str) else self.exports[key] for key in FILE_PARAMETERS]
+            self.indexes[files] = (modified, cohort_engine.index_data(*data))
+        return self.indexes[files][1]
+
+    def job_key(self, params):
+        """Identify a job by its parameters and the files it uses, so repeated jobs can return the earlier result."""
+        modified = [self.modified_times(params, key) for key in FILE_PARAMETERS]
+        return json.dumps([params, modified], sort_keys=True, default=str)
+
+    def load_job(self, params):
+        """Return the availabilities for a job (see load_index) and its key (see job_key). This runs in a thread, one at a time."""
+        with self.load_lock:
+            return self.load_index(params), self.job_key(params)
+
+    def preload_poll(self, path):
+        """Load a LettuceMeet JSON file ahead of time (see load_poll). This runs in a thread, one at a time."""
+        with self.load_lock:
+            return self.load_poll(path)
+
+    def check_job(self, params):
+        """Return what is wrong with a submitted job's parameters, or None if they can be run."""
+        if not isinstance(params, dict):
+            return "The job must be a JSON object with the parameters for process_data."
+        for key in FILE_PARAMETERS:
+            value = params.get(key)
+            if not isinstance(value, str) and not (isinstance(value, list) and value and all(isinstance(path, str) for path in value)):
+                return f"{key} must be the path to a file, or a list of paths."
+        return None
+
+    def submit(self, params):
+        """Add a job to the queue and return its id."""
+        job_id = str(next(self.job_ids))
+        job = {"id": job_id, "status": "queued", "params": params, "progress": [], "result": None, "error": None,
+               "changed": asyncio.Event(), "stop": multiprocessing.Event()}
+        self.jobs[job_id] = job
+        self.queue.put_nowait(job)
+        return job_id
+
+    def update(self, job, **changes):
+        """Update a job and wake up everyone waiting for news about it."""
+        job.update(changes)
+        job["changed"].set()
+        job["changed"] = asyncio.Event()
+
+    async def run(self, job):
+        """Run a job in a new process, passing its progress messages on as they arrive."""
+        params = job["params"]
+        try:
+            index, key = await asyncio.to_thread(self.load_job, params)
+        except Exception as e:
+            self.update(job, status="failed", error=f"Failed to load data: {e}")
+            return
+
+        if key in self.finished_jobs:
+            # The result is moved to the end, so the results used least recently are the first to go
+            result = self.finished_jobs.pop(key)
+            self.finished_jobs[key] = result
+            self.update(job, status="done", result=result, progress=job["progress"] + ["Reused an earlier result"])
+            return
+
+        time_limit = params.get("time_limit", self.default_time_limit)
+        if time_limit:
+            params = dict(params, time_limit=time_limit)
+
+        if job["stop"].is_set():
+            self.update(job, status="failed", error="The job was stopped before it started.")
+            return
+
+        self.update(job, status="running")
+        messages = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_job, args=(index, params, messages, job["stop"]))
+        process.start()
+        self.processes.add(process)
+        started = time.time()
+        outcome = None
+        try:
+            while outcome is None:
+                await asyncio.sleep(0.1)
+                outcome = self.drain_messages(job, messages)
+                if outcome is None and not process.is_alive():
+                    outcome = self.drain_messages(job, messages) or ("failed", f"The job stopped without a result (exit code {process.exitcode}).")
+                # The search stops itself at the time limit. This is only a safety net in case a stage doesn't check it.
+                if outcome is None and time_limit and time.time() - started > time_limit + TIME_LIMIT_GRACE:
+                    outcome = ("timed out", "The job did not finish within its time limit.")
+        finally:
+            # A job that has sent its result is given a moment to exit by itself
+            waited = 0
+            while outcome is not None and outcome[0] != "timed out" and process.is_alive() and waited < 5:
+                await asyncio.sleep(0.1)
+                waited += 0.1
+            stop_process(process)
+            self.processes.discard(process)
+            messages.close()
+
+        if outcome[0] != "done":
+            self.update(job, status=outcome[0], error=outcome[1])
+            return
+
+        _, result, complete = outcome
+        if complete:
+            self.finished_jobs[key] = result
+            if len(self.finished_jobs) > MAX_FINISHED_JOBS:
+                self.finished_jobs.pop(next(iter(self.finished_jobs)))
+        self.update(job, status="done", result=result)
+
+    def drain_messages(self, job, messages):
+        """Move the progress messages from a job's queue to the job, and return the job's outcome if it has sent it."""
+        progress = []
+        outcome = None
+        while outcome is None:
+            try:
+                message = messages.get_nowait()
+            except (Empty, OSError, EOFError):
+                break
+            if message[0] == "progress":
+                progress.append(message[1])
+            else:
+                outcome = message
+        if progress:
+            self.update(job, progress=job["progress"] + progress)
+        return outcome
+
+    async def worker(self):
+        """Take jobs from the queue one at a time. There is one of these per worker, so at most that many jobs run at once."""
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.run(job)
+            except Exception as e:
+                # The job fails, but the worker carries on with the next one
+                self.update(job, status="failed", error=f"The job failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def describe(self, job):
+        """The public part of a job, as returned to clients."""
+        return {key: job[key] for key in ("id", "status", "progress", "result", "error")}
+
+    async def handle_connection(self, reader, writer):
+        """Answer one HTTP request. The connection is closed afterwards."""
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            path = urlparse(target).path.rstrip("/")
+            await self.route(method, path, body, writer)
+        except (ValueError, json.JSONDecodeError) as e:
+            await self.respond(writer, 400, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body, writer):
+        """Dispatch a request to the matching endpoint."""
+        parts = path.strip("/").split("/")
+
+        if method == "GET" and path == "/health":
+            await self.respond(writer, 200, {"status": "ok", "polls": len(self.polls), "jobs": len(self.jobs)})
+
+        elif method == "POST" and path == "/polls":
+            # Load (or reload) a file ahead of time, so that the first job using it doesn't have to wait for it
+            request = json.loads(body or b"{}")
+            try:
+                data = await asyncio.to_thread(self.preload_poll, request["path"])
+            except (KeyError, TypeError, OSError, ValueError) as e:
+                await self.respond(writer, 400, {"error": f"Failed to load data: {e}"})
+                return
+            await self.respond(writer, 200, {"path": os.path.abspath(request["path"]), "responses": len(data['data']['event']['pollResponses'])})
+
+        elif method == "POST" and path == "/jobs":
+            params = json.loads(body or b"{}")
+            error = self.check_job(params)
+            if error is not None:
+                await self.respond(writer, 400, {"error": error})
+                return
+            await self.respond(writer, 202, {"id": self.submit(params)})
+
+        elif method == "GET" and len(parts) == 2 and parts[0] == "jobs" and parts[1] in self.jobs:
+            await self.respond(writer, 200, self.describe(self.jobs[parts[1]]))
+
+        elif method == "POST" and len(parts) == 3 and parts[0] == "jobs" and parts[1] in self.jobs and parts[2] == "stop":
+            # The search stops at its next check and the job finishes with the best cohorts found so far
+            job = self.jobs[parts[1]]
+            job["stop"].set()
+            await self.respond(writer, 202, {"id": job["id"], "status": job["status"]})
+
+        elif method == "GET" and len(parts) == 3 and parts[0] == "jobs" and parts[1] in self.jobs and parts[2] == "events":
+            await self.stream_events(self.jobs[parts[1]], writer)
+
+        else:
+            await self.respond(writer, 404, {"error": f"No endpoint for {method} {path}"})
+
+    async def respond(self, writer, status, content):
+        """Send a JSON response."""
+        body = json.dumps(content).encode()
+        writer.write(f"HTTP/1.1 {status} {http.client.responses[status]}\r\n".encode())
+        writer.write(b"Content-Type: application/json\r\nConnection: close\r\n")
+        writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode())
+        writer.write(body)
+        await writer.drain()
+
+    async def stream_events(self, job, writer):
+        """
+        Stream a job's progress as one JSON object per line, until the job has finished.
+        Each line has the job's status and its new progress messages, and the last line also has the result or error.
+        """
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        sent = 0
+        while True:
+            changed = job["changed"]
+            finished = job["status"] not in ("queued", "running")
+            event = {"status": job["status"], "progress": job["progress"][sent:]}
+            sent = len(job["progress"])
+            if finished:
+                event.update(result=job["result"], error=job["error"])
+            line = json.dumps(event).encode() + b"\n"
+            writer.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            await writer.drain()
+            if finished:
+                break
+            await changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, ready=None):
+        """Start the workers and the HTTP server, and serve until cancelled. ready is an optional function called with the address once listening."""
+        self.queue = asyncio.Queue()
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+            address = "unix:" + unix_socket
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            address = "http://%s:%d" % server.sockets[0].getsockname()[:2]
+        if ready is not None:
+            ready(address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in workers:
+                task.cancel()
+            for process in list(self.processes):
+                stop_process(process)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket, for servers started with --unix."""
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(address, timeout=None):
+    """Open a connection to a server address, either "http://host:port" or "unix:/path/to/socket"."""
+    if address.startswith("unix:"):
+        return UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    url = urlparse(address if "://" in address else "http://" + address)
+    return http.client.HTTPConnection(url.hostname or DEFAULT_HOST, url.port or DEFAULT_PORT, timeout=timeout)
+
+
+def request(address, method, path, content=None):
+    """Send a request to the server and return the decoded JSON response."""
+    connection = connect(address)
+    try:
+        body = json.dumps(content) if content is not None else None
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        reply = json.loads(response.read() or b"{}")
+        if response.status >= 400:
+            raise ValueError(reply.get("error", f"The job server answered with status {response.status}"))
+        return reply
+    finally:
+        connection.close()
+
+
+def submit_job(address, params):
+    """Submit a job with process_data parameters to the server and return its id."""
+    params = dict(params)
+    for key in FILE_PARAMETERS + ("checkpoint_file",):
+        if isinstance(params.get(key), list):
+            params[key] = [os.path.abspath(path) for path in params[key]]
+        elif params.get(key):
+            params[key] = os.path.abspath(params[key])
+    return request(address, "POST", "/jobs", params)["id"]
+
+
+def stop_job(address, job_id):
+    """Ask the server to stop a job. The job then finishes with the best cohorts found so far, which wait_for_job returns."""
+    request(address, "POST", f"/jobs/{job_id}/stop")
+
+
+def wait_for_job(address, job_id, on_progress=None):
+    """
+    Follow a job's progress until it has finished, calling on_progress with each progress message.
+    Returns the result in the same format as process_data, or raises the job's error.
+    """
+    connection = connect(address)
+    try:
+        connection.request("GET", f"/jobs/{job_id}/events")
+        response = connection.getresponse()
+        if response.status >= 400:
+            raise ValueError(json.loads(response.read() or b"{}").get("error", f"Unknown job {job_id}"))
+        for line in response:
+            event = json.loads(line)
+            if on_progress is not None:
+                for message in event["progress"]:
+                    on_progress(message)
+            if event["status"] == "done":
+                return decode_result(event["result"])
+            if event["status"] == "timed out":
+                raise TimeoutError(event["error"])
+            if event["status"] == "failed":
+                raise ValueError(event["error"])
+        raise ConnectionError("The job server closed the connection before the job finished.")
+    finally:
+        connection.close()
+
+
+def process_data_on_server(address, params, on_progress=None):
+    """Run process_data on the job server instead of in this process. The parameters and the result are the same as for process_data."""
+    return wait_for_job(address, submit_job(address, params), on_progress)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local job server for forming cohorts from LettuceMeet data.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--unix", help="Listen on this Unix socket instead of a port")
+    parser.add_argument("--workers", type=int, help="Number of jobs to run at once (default: number of CPUs)")
+    parser.add_argument("--time-limit", type=float, help="Default time limit in seconds for jobs that don't set one")
+    parser.add_argument("--preload", nargs="*", default=[], help="LettuceMeet JSON files to load at startup")
+    args = parser.parse_args()
+
+    job_server = JobServer(workers=args.workers, default_time_limit=args.time_limit)
+    for path in args.preload:
+        job_server.load_poll(path)
+    try:
+        asyncio.run(job_server.serve(args.host, args.port, args.unix, ready=lambda address: print(f"Job server listening on {address}")))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,333 @@
+# This file contains the local search used to improve a schedule of cohorts, or to build one quickly for very large polls.
+# It is called by the other files and you do not need to modify or run it.
+
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+
+# Number of annealing iterations between checks of whether the local search should stop
+STOP_CHECK_ITERATIONS = 100
+
+# Seconds between checks of should_stop while the restarts run in the process pool
+STOP_CHECK_INTERVAL = 0.1
+
+
+def build_slot_index(participants_availabilities, facilitators_info, time_block, possible_times):
+    """
+    Build an index of every possible meeting slot, stepping through each poll day in half-hour steps.
+    Returns a list of (start, end, available participants, available facilitators) tuples.
+    """
+    slots = []
+    for day in possible_times:
+        current_time = day[0]
+        end_time = day[1]
+        while current_time + timedelta(hours=time_block) <= end_time:
+            slot_end_time = current_time + timedelta(hours=time_block)
+            participants = frozenset(
+                p for p in participants_availabilities
+                if participants_availabilities[p].covers(current_time, slot_end_time)
+            )
+            facilitators = tuple(
+                f for f in facilitators_info
+                if facilitators_info[f][1] > 0 and facilitators_info[f][0].covers(current_time, slot_end_time)
+            )
+            slots.append((current_time, slot_end_time, participants, facilitators))
+            current_time += timedelta(minutes=30)
+    return slots
+
+
+def _anneal(slots, cohorts, participants, capacity, min_size, max_size, seed, time_budget, max_iterations, should_stop=None):
+    """
+    Run one simulated annealing restart. The objective is the number of applicants left out of the cohorts.
+    Each proposed move is accepted with the Metropolis rule: always if it doesn't leave more applicants out,
+    and otherwise with probability exp(-change / temperature).
+    cohorts: list of (slot index, members, facilitator) tuples to start from
+    should_stop: optional function, checked every STOP_CHECK_ITERATIONS iterations, that returns True to end the restart early
+    Returns the best objective found and the matching cohorts.
+    """
+    rng = random.Random(seed)
+    cohorts = [[slot, list(members), facilitator] for slot, members, facilitator in cohorts]
+    placed = {name for _, members, _ in cohorts for name in members}
+    unassigned = [p for p in participants if p not in placed]
+    used = {f: 0 for f in capacity}
+    for _, _, facilitator in cohorts:
+        used[facilitator] += 1
+
+    best_score = len(unassigned)
+    best_cohorts = [(slot, tuple(members), facilitator) for slot, members, facilitator in cohorts]
+
+    # The temperature cools geometrically from start_temperature to end_temperature over the time budget
+    start_temperature = 1.0
+    end_temperature = 0.05
+    started = time.monotonic()
+    iteration = 0
+    temperature = start_temperature
+
+    def accept(change):
+        return change <= 0 or rng.random() < math.exp(-change / temperature)
+
+    while cohorts and best_score > 0:
+        if max_iterations is not None and iteration >= max_iterations:
+            break
+        elapsed = time.monotonic() - started
+        if elapsed >= time_budget:
+            break
+        if should_stop is not None and iteration % STOP_CHECK_ITERATIONS == 0 and should_stop():
+            break
+        if max_iterations is not None:
+            progress = iteration / max_iterations
+        else:
+            progress = elapsed / time_budget
+        temperature = start_temperature * (end_temperature / start_temperature) ** progress
+        iteration += 1
+
+        move = rng.randrange(5)
+        cohort = rng.choice(cohorts)
+        slot_participants = slots[cohort[0]][2]
+
+        if move == 0:
+            # Move: pull an unassigned applicant into a cohort that still has room
+            if len(cohort[1]) >= max_size:
+                continue
+            options = [p for p in unassigned if p in slot_participants]
+            if not options:
+                continue
+            if not accept(-1):
+                continue
+            applicant = rng.choice(options)
+            unassigned.remove(applicant)
+            cohort[1].append(applicant)
+
+        elif move == 1:
+            # Swap: exchange a cohort member with an unassigned applicant who can make the same time
+            options = [p for p in unassigned if p in slot_participants]
+            if not options:
+                continue
+            if not accept(0):
+                continue
+            applicant = rng.choice(options)
+            index = rng.randrange(len(cohort[1]))
+            unassigned.remove(applicant)
+            unassigned.append(cohort[1][index])
+            cohort[1][index] = applicant
+
+        elif move == 2:
+            # Move: relocate a member to another cohort that meets at a time they can make
+            if len(cohort[1]) <= min_size:
+                continue
+            member = rng.choice(cohort[1])
+            targets = [c for c in cohorts if c is not cohort and len(c[1]) < max_size and member in slots[c[0]][2]]
+            if not targets or not accept(0):
+                continue
+            target = rng.choice(targets)
+            cohort[1].remove(member)
+            target[1].append(member)
+
+        elif move == 3:
+            # Slot shift: move the whole cohort to another time where every member and a facilitator is available
+            new_slot = rng.randrange(len(slots))
+            if new_slot == cohort[0] or not all(m in slots[new_slot][2] for m in cohort[1]):
+                continue
+            facilitators = slots[new_slot][3]
+            if cohort[2] in facilitators:
+                facilitator = cohort[2]
+            else:
+                options = [f for f in facilitators if used[f] < capacity[f]]
+                if not options:
+                    continue
+                facilitator = rng.choice(options)
+            if not accept(0):
+                continue
+            used[cohort[2]] -= 1
+            used[facilitator] += 1
+            cohort[0] = new_slot
+            cohort[2] = facilitator
+
+        else:
+            # Drop: put a member back on the unassigned list, which leaves one more applicant out
+            if len(cohort[1]) <= min_size or not accept(1):
+                continue
+            member = rng.choice(cohort[1])
+            cohort[1].remove(member)
+            unassigned.append(member)
+
+        if len(unassigned) < best_score:
+            best_score = len(unassigned)
+            best_cohorts = [(slot, tuple(members), facilitator) for slot, members, facilitator in cohorts]
+
+    return best_score, best_cohorts
+
+
+# Default number of restarts, so that each call doesn't take every CPU
+MAX_DEFAULT_RESTARTS = 4
+
+# The process pool for the restarts, started on first use and kept for the later calls (e.g. one call per course)
+_executor = None
+_executor_workers = 0
+
+# Event shared with the workers of the process pool, set to end the restarts that are running early
+_stop_event = None
+
+
+def _set_stop_event(event):
+    """Keep the stop event in a worker of the process pool."""
+    global _stop_event
+    _stop_event = event
+
+
+def _stop_event_is_set():
+    """Return True if the restarts should stop. This is passed to the restarts in the process pool as their should_stop function."""
+    return _stop_event.is_set()
+
+
+def _restart_executor(workers):
+    """Return the shared process pool, starting it (again) if there isn't one with at least this many workers."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers < workers:
+        if _executor is not None:
+            _executor.shutdown()
+        _set_stop_event(multiprocessing.Event())
+        _executor = ProcessPoolExecutor(max_workers=workers, initializer=_set_stop_event, initargs=(_stop_event,))
+        _executor_workers = workers
+    return _executor
+
+
+def _run_restarts(slots, cohorts, participants, capacity, min_size, max_size, time_budget, restarts, seed, max_iterations, should_stop=None):
+    """
+    Run seeded annealing restarts, in the shared process pool when there is more than one, and return the best result.
+    should_stop: optional function that returns True to end the restarts early, keeping the best cohorts each has found so far
+    """
+    global _executor
+    if restarts is None:
+        restarts = min(os.cpu_count() or 1, MAX_DEFAULT_RESTARTS)
+    args = [
+        (slots, cohorts, participants, capacity, min_size, max_size, seed + i, time_budget, max_iterations)
+        for i in range(restarts)
+    ]
+
+    if restarts == 1:
+        results = [_anneal(*args[0], should_stop)]
+    else:
+        try:
+            executor = _restart_executor(min(restarts, os.cpu_count() or 1))
+            _stop_event.clear()
+            futures = [executor.submit(_anneal, *arguments, _stop_event_is_set) for arguments in args]
+            # should_stop may only work in this process (e.g. it checks a threading.Event), so it is checked here and passed on through the stop event
+            if should_stop is not None:
+                while wait(futures, timeout=STOP_CHECK_INTERVAL).not_done:
+                    if should_stop():
+                        _stop_event.set()
+                        break
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            # A worker died (e.g. it was killed), so the next call starts a new pool
+            _executor = None
+            raise
+
+    # Ties go to the lowest seed, so the result only depends on the seed and not on scheduling
+    return min(results, key=lambda result: result[0])
+
+
+def improve_cohorts(cohorts, participants_availabilities, facilitators_info, min_size, max_size, time_block, possible_times,
+                    time_budget=5.0, restarts=None, seed=0, max_iterations=None, should_stop=None):
+    """
+    Improve a selected schedule with a local search, trying to place as many of the unassigned applicants as possible.
+
+    Args:
+        cohorts (list): The selected cohorts, as (start, end, participants, facilitator) tuples.
+        participants_availabilities (dict): Availabilities of every applicant that can be placed.
+        facilitators_info (dict): Facilitator availabilities and capacities.
+        min_size (int): Minimum size of each cohort.
+        max_size (int): Maximum size of each cohort.
+        time_block (float): Duration of each time block in hours.
+        possible_times (list): Start and end of each poll day.
+        time_budget (float): Seconds each restart is allowed to run.
+        restarts (int): Number of seeded restarts, run in parallel. Defaults to the number of CPUs, up to MAX_DEFAULT_RESTARTS.
+        seed (int): Seed of the first restart.
+        max_iterations (int): Optional iteration limit per restart, which makes the result independent of machine speed.
+        should_stop (function): Optional function that returns True to end the local search early, keeping the best cohorts found so far.
+
+    Returns:
+        list: The improved cohorts, in the same format and order as the input. The input is returned unchanged if no improvement was found.
+    """
+    if not cohorts:
+        return cohorts
+
+    slots = build_slot_index(participants_availabilities, facilitators_info, time_block, possible_times)
+    slot_by_start = {slot[0]: i for i, slot in enumerate(slots)}
+    capacity = {facilitator: info[1] for facilitator, info in facilitators_info.items()}
+    if any(cohort[0] not in slot_by_start for cohort in cohorts):
+        return cohorts
+    initial = [(slot_by_start[start], participants, facilitator) for start, _, participants, facilitator in cohorts]
+    participants = list(participants_availabilities)
+    initial_score = len(set(participants) - {name for cohort in cohorts for name in cohort[2]})
+
+    score, best = _run_restarts(slots, initial, participants, capacity, min_size, max_size, time_budget, restarts, seed, max_iterations, should_stop)
+    if score >= initial_score:
+        return cohorts
+    return [(slots[slot][0], slots[slot][1], members, facilitator) for slot, members, facilitator in best]
+
+
+def _greedy_cohorts(slots, participants, capacity, facilitator_slot_counts, num_cohorts, min_size, max_size):
+    """
+    Open up to num_cohorts cohorts one at a time, each at the slot with the most unassigned applicants.
+    Each cohort takes at most max_size of them, and leaves at least min_size applicants for each cohort still to open.
+    Returns a list of (slot index, members, facilitator) tuples, which is shorter than num_cohorts if no more cohorts could be opened.
+    """
+    remaining_capacity = dict(capacity)
+    unassigned = set(participants)
+    greedy = []
+    for opened in range(num_cohorts):
+        best = None
+        for i, (_, _, available, facilitators) in enumerate(slots):
+            options = [f for f in facilitators if remaining_capacity[f] > 0]
+            if not options:
+                continue
+            free = [p for p in participants if p in unassigned and p in available]
+            if len(free) >= min_size and (best is None or len(free) > len(best[2])):
+                best = (i, min(options, key=lambda f: facilitator_slot_counts[f]), free)
+        if best is None:
+            break
+        slot, facilitator, free = best
+        size = max(min_size, min(max_size, len(unassigned) - min_size * (num_cohorts - opened - 1)))
+        members = tuple(free[:size])
+        unassigned.difference_update(members)
+        remaining_capacity[facilitator] -= 1
+        greedy.append((slot, members, facilitator))
+    return greedy
+
+
+def heuristic_cohorts(participants_availabilities, facilitators_info, num_cohorts, min_size, max_size, time_block, possible_times,
+                      time_budget=5.0, restarts=None, seed=0, max_iterations=None, should_stop=None):
+    """
+    Form cohorts without enumerating every possible cohort, for polls that are too large for the exact search.
+    A greedy schedule is built first, opening each cohort at the time with the most unassigned applicants,
+    and it is then improved with the local search. The arguments are the same as for improve_cohorts.
+    """
+    slots = build_slot_index(participants_availabilities, facilitators_info, time_block, possible_times)
+    capacity = {facilitator: info[1] for facilitator, info in facilitators_info.items()}
+
+    # Applicants who can make the fewest slots are placed first, since they are the hardest to fit in later
+    slot_counts = {p: sum(p in slot[2] for slot in slots) for p in participants_availabilities}
+    participants = sorted(participants_availabilities, key=lambda p: slot_counts[p])
+
+    # Facilitators who can make the fewest slots are also used first, keeping the more flexible ones for later cohorts
+    facilitator_slot_counts = {f: sum(f in slot[3] for slot in slots) for f in facilitators_info}
+
+    # The greedy cohorts are first made as large as possible while leaving enough applicants for the cohorts still to open.
+    # If that doesn't open every cohort, they are opened again with min_size members each, and the local search fills them up.
+    for fill_to_max in (True, False):
+        greedy = _greedy_cohorts(slots, participants, capacity, facilitator_slot_counts, num_cohorts, min_size, max_size if fill_to_max else min_size)
+        if len(greedy) == num_cohorts:
+            break
+    else:
+        raise ValueError("Unable to form the requested number of cohorts with the given parameters. Please adjust the parameters.")
+
+    _, best = _run_restarts(slots, greedy, participants, capacity, min_size, max_size, time_budget, restarts, seed, max_iterations, should_stop)
+    return [(slots[slot][0], slots[slot][1], members, facilitator) for slot, members, facilitator in best]
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are scripts in the repository root rather than a package
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
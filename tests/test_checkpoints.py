@@ -0,0 +1,128 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+import cohort_engine
+from conftest import REPOSITORY
+
+
+def sample_search(seed=2):
+    """
+    A joint search on the sample polls, with the applicants split between two courses at random and random facilitator capacities.
+    With the default seed it searches about a thousand nodes. Returns a function that starts it with the given arguments,
+    with the arguments it always passes under search.arguments.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(REPOSITORY, "anonymized_file.json")) as file:
+        participant_data = json.load(file)
+    with open(os.path.join(REPOSITORY, "facilitator_test.json")) as file:
+        facilitator_data = json.load(file)
+    availabilities, possible_times, _ = cohort_engine.extract_participant_availabilities(participant_data, 1.5, {}, False)
+    facilitators = cohort_engine.extract_facilitator_availabilities(facilitator_data, participant_data)
+
+    names = sorted(availabilities)
+    rng.shuffle(names)
+    applicants = {"align": names[:12], "gov": names[12:20]}
+    info = {name: [facilitators[name], rng.randint(1, 2), set(rng.sample(["align", "gov"], rng.randint(1, 2)))] for name in sorted(facilitators)}
+    possible_cohorts = {
+        course: cohort_engine.find_all_possible_cohorts({name: availabilities[name] for name in names}, info, 3, 4, 1.5, possible_times)
+        for course, names in applicants.items()
+    }
+
+    def search(**arguments):
+        return cohort_engine.iter_best_cohorts_jointly(*search.arguments, **arguments)
+
+    search.arguments = (possible_cohorts, {"align": 3, "gov": 1}, 3, info)
+    return search
+
+
+def saved_stats(checkpoint_file):
+    with open(checkpoint_file) as file:
+        return json.load(file)["stats"]
+
+
+def interrupt_after(lines, function=None):
+    """
+    A trace function that raises KeyboardInterrupt, as Ctrl-C would, after the given number of lines of cohort_engine have run.
+    If a function name is given, only the lines of that function are counted, so the interrupt lands somewhere inside it.
+    """
+    count = [0]
+
+    def trace_line(frame, event, arg):
+        if event == "line" and (function is None or frame.f_code.co_name == function):
+            count[0] += 1
+            if count[0] == lines:
+                raise KeyboardInterrupt
+        return trace_line
+
+    def trace_call(frame, event, arg):
+        return trace_line if frame.f_code.co_filename == cohort_engine.__file__ else None
+
+    return trace_call
+
+
+def run_with_interrupts(search, checkpoint_file, rng, lines, function=None):
+    """
+    Run the search to the end, interrupting it after a random number of lines (between the two given) and resuming it each time.
+    Returns the last selection and the number of nodes saved at each interrupt.
+    """
+    saved_nodes = []
+    last = None
+    while True:
+        sys.settrace(interrupt_after(rng.randint(*lines), function))
+        try:
+            for selection, value, _ in search(checkpoint_file=checkpoint_file, resume=True):
+                last = (selection, value)
+            return last, saved_nodes
+        except KeyboardInterrupt:
+            saved_nodes.append(saved_stats(checkpoint_file)["nodes"])
+        finally:
+            sys.settrace(None)
+
+
+@pytest.mark.parametrize("function, lines", [(None, (20000, 300000)), ("next_branch", (500, 5000))])
+def test_ctrl_c_saves_the_search(tmp_path, function, lines):
+    search = sample_search()
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    expected = list(search(checkpoint_file=checkpoint_file))[-1][:2]
+    expected_nodes = saved_stats(checkpoint_file)["nodes"]
+    os.remove(checkpoint_file)
+
+    # Ctrl-C at random lines, or halfway through moving a frame on to its next branch, resuming after each
+    last, saved_nodes = run_with_interrupts(search, checkpoint_file, random.Random(0), lines, function)
+
+    # Each interrupt saved the search so far, and resuming carried on from there rather than starting again
+    assert len(saved_nodes) >= 3
+    assert 0 < saved_nodes[0] and saved_nodes == sorted(saved_nodes)
+    assert saved_stats(checkpoint_file)["nodes"] <= expected_nodes + len(saved_nodes)
+    assert last == expected
+
+
+def test_stopping_and_resuming_matches_an_uninterrupted_search(tmp_path):
+    search = sample_search()
+    expected = list(search())[-1][:2]
+
+    # Stop at a random check each time (the search checks should_stop every 100 nodes), resuming until the search finishes on its own.
+    # A resumed search yields the best selection saved so far first, so the last selection yielded is the best one overall.
+    rng = random.Random(1)
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    saved_nodes = []
+    for _ in range(50):
+        checks = [rng.randint(1, 3)]
+
+        def should_stop():
+            checks[0] -= 1
+            return checks[0] == 0
+
+        results = list(search(should_stop=should_stop, checkpoint_file=checkpoint_file, resume=True))
+        if checks[0] > 0:
+            break
+        saved_nodes.append(saved_stats(checkpoint_file)["nodes"])
+    else:
+        pytest.fail("The search did not finish after being resumed 50 times")
+
+    assert len(saved_nodes) >= 3 and saved_nodes == sorted(saved_nodes)
+    assert results[-1][:2] == expected
@@ -0,0 +1,69 @@
+import os
+
+import cohort_engine
+from conftest import REPOSITORY
+
+ALIGNMENT_NAMES = ['Participant_9815', 'Participant_8903', 'Participant_4697', 'Participant_4252', 'Participant_1341',
+                   'Participant_5185', 'Participant_1058', 'Participant_4268', 'Participant_3411', 'Participant_5607',
+                   'Participant_3569', 'Participant_8043', 'Participant_3020', 'Participant_7441', 'Participant_8474',
+                   'Participant_1885', 'Participant_3866', 'Participant_5060', 'Participant_2590', 'Participant_4674',
+                   'Participant_7913', 'Participant_5398', 'Participant_6732', 'Participant_1212', 'Participant_7176', 'Participant_2122']
+
+GOVERNANCE_NAMES = ['Participant_8148', 'Participant_6002', 'Participant_5263', 'Participant_8951', 'Participant_6396',
+                    'Participant_8419', 'Participant_9931', 'Participant_9400', 'Participant_9497', 'Participant_9371',
+                    'Participant_7496', 'Participant_6966']
+
+
+def sample_params(**changes):
+    """The parameters at the bottom of cohort_formation_noGui.py, for the sample polls."""
+    params = {
+        "participant_file_path": os.path.join(REPOSITORY, "anonymized_file.json"),
+        "facilitator_file_path": os.path.join(REPOSITORY, "facilitator_test.json"),
+        "courses": {
+            "align": {"name": "Alignment", "applicants": ALIGNMENT_NAMES, "num_cohorts": 4},
+            "gov": {"name": "Governance", "applicants": GOVERNANCE_NAMES, "num_cohorts": 2},
+        },
+        "num_total_cohorts": 6,
+        "min_size": 4,
+        "max_size": 6,
+        "time_block": 1.5,
+        "facilitator_capacity_course_entries": {
+            'facilitator1': [1, "align"],
+            'facilitator2': [2, "gov"],
+            'facilitator3': [2, "align"],
+            'facilitator4': [1, "align"],
+        },
+        "filter_by_course": True,
+        "local_search_time": 0,
+        "search_time": 0,
+    }
+    params.update(changes)
+    return params
+
+
+def placed(result):
+    return sum(len(cohort[2]) for cohorts in result["course cohorts"].values() for cohort in cohorts)
+
+
+def test_shared_facilitator_does_not_make_the_search_worse():
+    strict = cohort_engine.process_data(sample_params())
+    entries = dict(sample_params()["facilitator_capacity_course_entries"], facilitator2=[2, ["gov", "align"]])
+    shared = cohort_engine.process_data(sample_params(facilitator_capacity_course_entries=entries, time_limit=60))
+
+    assert [len(shared["course cohorts"][course]) for course in ("align", "gov")] == [4, 2]
+    assert placed(shared) >= placed(strict)
+    used = [cohort[3] for cohorts in shared["course cohorts"].values() for cohort in cohorts]
+    assert all(used.count(name) <= entries[name][0] for name in entries)
+
+
+
+def test_heuristic_mode_forms_every_cohort():
+    params = sample_params(heuristic_mode=True, local_search_time=0.5)
+    for filter_by_course in (True, False):
+        result = cohort_engine.process_data(dict(params, filter_by_course=filter_by_course))
+        cohorts = list(result["course cohorts"].values()) if filter_by_course else [result["misc cohorts"]]
+        assert sum(len(course_cohorts) for course_cohorts in cohorts) == 6
+        assert all(params["min_size"] <= len(cohort[2]) <= params["max_size"] for course_cohorts in cohorts for cohort in course_cohorts)
+        used = [cohort[3] for course_cohorts in cohorts for cohort in course_cohorts]
+        entries = params["facilitator_capacity_course_entries"]
+        assert all(used.count(name) <= entries[name][0] for name in entries)
@@ -0,0 +1,97 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import cohort_engine
+import diagnostics
+from intervals import normalize_intervals
+from test_cohort_engine import ALIGNMENT_NAMES, sample_params
+
+MONDAY = datetime(2024, 1, 1)
+POSSIBLE_TIMES = [(MONDAY + timedelta(hours=9), MONDAY + timedelta(hours=13))]
+
+
+def at(hour):
+    return MONDAY + timedelta(hours=hour)
+
+
+def available(*spans):
+    return normalize_intervals([(at(start), at(end)) for start, end in spans])
+
+
+def explain(cohorts, participants, facilitators, num_cohorts, min_size=1, max_size=2, not_available=()):
+    return diagnostics.explain_unplaced(cohorts, participants, facilitators, num_cohorts, min_size, max_size, 1, POSSIBLE_TIMES, not_available)
+
+
+def test_full_cohort_is_a_size_cap_and_a_cohort_with_room_is_joinable():
+    cohorts = [(at(9), at(10), ("A", "B"), "f"), (at(11), at(12), ("C",), "f")]
+    participants = {name: available((9, 10)) for name in "AB"}
+    participants.update(C=available((11, 12)), X=available((9, 10), (11, 12)))
+    result = explain(cohorts, participants, {"f": (available((9, 13)), 3)}, num_cohorts=3)
+
+    assert list(result) == ["X"]
+    assert result["X"]["windows"] == [(at(9), at(10)), (at(11), at(12))]
+    assert result["X"]["joinable"] == [2]
+    assert result["X"]["blockers"] == [diagnostics.SIZE_CAP]
+
+
+def test_no_facilitator():
+    result = explain([], {"X": available((9, 10))}, {"f": (available((11, 13)), 1)}, num_cohorts=1)
+    assert result["X"]["blockers"] == [diagnostics.NO_FACILITATOR]
+
+
+def test_facilitator_without_capacity_left():
+    cohorts = [(at(11), at(12), ("A",), "f")]
+    participants = {"A": available((11, 12)), "X": available((9, 10))}
+    result = explain(cohorts, participants, {"f": (available((9, 13)), 1)}, num_cohorts=2)
+    assert result["X"]["blockers"] == [diagnostics.NO_FACILITATOR]
+
+
+def test_cohort_limit():
+    cohorts = [(at(11), at(12), ("A",), "f")]
+    participants = {"A": available((11, 12)), "X": available((9, 10))}
+    result = explain(cohorts, participants, {"f": (available((9, 13)), 2)}, num_cohorts=1)
+    assert result["X"]["blockers"] == [diagnostics.COHORT_LIMIT]
+
+
+def test_too_few_applicants():
+    result = explain([], {"X": available((9, 10))}, {"f": (available((9, 13)), 1)}, num_cohorts=1, min_size=2)
+    assert result["X"]["blockers"] == [diagnostics.TOO_FEW_APPLICANTS]
+
+
+def test_no_matching_window():
+    result = explain([], {"X": available((9, 9.5), (12.5, 14))}, {"f": (available((9, 13)), 1)}, num_cohorts=1, not_available=["Y"])
+    assert result["X"] == {"windows": [], "joinable": [], "blockers": [diagnostics.NO_MATCHING_WINDOW]}
+    assert result["Y"] == {"windows": [], "joinable": [], "blockers": [diagnostics.NO_MATCHING_WINDOW]}
+    assert diagnostics.describe_diagnosis(result["X"]) == "not available for a whole time block at any of the poll times."
+
+
+def test_course_mode_explains_applicants_without_a_course():
+    # Participant_9815 is available and Participant_5185 is skipped for low availability, and neither is in a course here
+    params = sample_params(diagnostics=True)
+    params["courses"]["align"]["applicants"] = [name for name in ALIGNMENT_NAMES if name not in ("Participant_9815", "Participant_5185")]
+    result = cohort_engine.process_data(params)["diagnostics"]
+
+    assert result["Participant_9815"] == {"windows": [], "joinable": [], "blockers": [diagnostics.NO_COURSE], "course": None}
+    assert result["Participant_5185"]["blockers"] == [diagnostics.NO_MATCHING_WINDOW, diagnostics.NO_COURSE]
+    assert result["Participant_5185"]["course"] is None
+    assert diagnostics.describe_diagnosis(result["Participant_9815"]) == "not assigned to a course."
+    assert all(diagnosis["course"] in ("align", "gov") for name, diagnosis in result.items() if name not in ("Participant_9815", "Participant_5185"))
+
+
+def test_a_thousand_applicants_are_explained_quickly():
+    rng = random.Random(0)
+    possible_times = [(at(24 * day + 9), at(24 * day + 21)) for day in range(5)]
+    participants = {}
+    for number in range(1000):
+        starts = [24 * rng.randrange(5) + 9 + rng.randrange(24) / 2 for _ in range(3)]
+        participants[f"Participant_{number}"] = normalize_intervals([(at(start), at(start + rng.choice([0.5, 1.5, 3]))) for start in starts])
+    facilitators = {f"facilitator{number}": (normalize_intervals([(at(24 * day + 9), at(24 * day + 21)) for day in range(0, 5, 2)]), 1) for number in range(10)}
+    cohorts = [(at(10), at(11.5), tuple(sorted(participants)[:6]), "facilitator0")]
+
+    started = time.perf_counter()
+    result = diagnostics.explain_unplaced(cohorts, participants, facilitators, 20, 4, 6, 1.5, possible_times)
+    elapsed = time.perf_counter() - started
+
+    assert len(result) == 994
+    assert elapsed < 0.5
@@ -0,0 +1,157 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import cohort_engine
+import exports
+from exports import ExportStore
+
+
+def write_export(path, dates, responses, start="09:00:00.000Z", end="17:00:00.000Z"):
+    """Write a LettuceMeet export. responses: (name, updatedAt, [(start, end)]) tuples, with the times as "YYYY-MM-DD HH:MM"."""
+    def time_text(text):
+        return datetime.strptime(text, "%Y-%m-%d %H:%M").strftime(exports.TIME_FORMAT)
+
+    event = {
+        "title": path.stem,
+        "pollStartTime": start,
+        "pollEndTime": end,
+        "pollDates": dates,
+        "pollResponses": [
+            {"user": {"name": name}, "updatedAt": updated_at,
+             "availabilities": [{"start": time_text(span_start), "end": time_text(span_end)} for span_start, span_end in spans]}
+            for name, updated_at, spans in responses
+        ],
+    }
+    path.write_text(json.dumps({"data": {"event": event}}))
+    return str(path)
+
+
+def at(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M")
+
+
+def participants(store):
+    return dict(cohort_engine.index_data(store, store)["participants"])
+
+
+def test_exports_from_different_weeks_line_up_on_the_week_grid(tmp_path):
+    # The second poll runs two weeks later, on the Monday and Wednesday
+    first = write_export(tmp_path / "first.json", ["2024-01-01", "2024-01-02"], [("A", "", [("2024-01-01 09:00", "2024-01-01 11:00")])])
+    second = write_export(tmp_path / "second.json", ["2024-01-15", "2024-01-17"], [("B", "", [("2024-01-15 10:00", "2024-01-15 12:00"),
+                                                                                             ("2024-01-17 13:00", "2024-01-17 14:00")])])
+    store = ExportStore()
+    store.update([second, first])
+    index = cohort_engine.index_data(store, store)
+
+    assert index["possible_times"] == [(at("2024-01-01 09:00"), at("2024-01-01 17:00")), (at("2024-01-02 09:00"), at("2024-01-02 17:00")),
+                                       (at("2024-01-03 09:00"), at("2024-01-03 17:00"))]
+    assert dict(index["participants"]) == {
+        "B": ((at("2024-01-01 10:00"), at("2024-01-01 12:00")), (at("2024-01-03 13:00"), at("2024-01-03 14:00"))),
+        "A": ((at("2024-01-01 09:00"), at("2024-01-01 11:00")),),
+    }
+    assert index["facilitators"] == dict(index["participants"])
+
+
+def test_latest_response_is_kept(tmp_path):
+    first = write_export(tmp_path / "first.json", ["2024-01-01"], [
+        ("A", "2024-01-05T00:00:00.000Z", [("2024-01-01 09:00", "2024-01-01 10:00")]),
+        ("B", "2024-01-02T00:00:00.000Z", [("2024-01-01 09:00", "2024-01-01 10:00")]),
+        ("C", "2024-01-02T00:00:00.000Z", [("2024-01-01 09:00", "2024-01-01 10:00")]),
+        ("C", "2024-01-01T00:00:00.000Z", [("2024-01-01 11:00", "2024-01-01 12:00")]),
+    ])
+    second = write_export(tmp_path / "second.json", ["2024-01-01"], [
+        ("A", "2024-01-04T00:00:00.000Z", [("2024-01-01 13:00", "2024-01-01 14:00")]),
+        ("B", "2024-01-03T00:00:00.000Z", [("2024-01-01 13:00", "2024-01-01 14:00")]),
+    ])
+    store = ExportStore()
+    store.update([first, second])
+    result = participants(store)
+
+    # A's first response is newer, B's second one is, and C's older response later in the same export is ignored
+    assert result["A"] == ((at("2024-01-01 09:00"), at("2024-01-01 10:00")),)
+    assert result["B"] == ((at("2024-01-01 13:00"), at("2024-01-01 14:00")),)
+    assert result["C"] == ((at("2024-01-01 09:00"), at("2024-01-01 10:00")),)
+
+
+def test_responses_updated_at_the_same_time_are_taken_from_the_later_export(tmp_path):
+    updated_at = "2024-01-05T00:00:00.000Z"
+    first = write_export(tmp_path / "first.json", ["2024-01-01"], [("A", updated_at, [("2024-01-01 09:00", "2024-01-01 10:00")]),
+                                                                   ("A", updated_at, [("2024-01-01 10:00", "2024-01-01 11:00")])])
+    second = write_export(tmp_path / "second.json", ["2024-01-01"], [("A", updated_at, [("2024-01-01 13:00", "2024-01-01 14:00")])])
+    store = ExportStore()
+
+    # Within one export the later response is kept
+    store.update([first])
+    assert participants(store)["A"] == ((at("2024-01-01 10:00"), at("2024-01-01 11:00")),)
+
+    store.update([first, second])
+    assert participants(store)["A"] == ((at("2024-01-01 13:00"), at("2024-01-01 14:00")),)
+    store.update([second, first])
+    assert participants(store)["A"] == ((at("2024-01-01 10:00"), at("2024-01-01 11:00")),)
+
+
+def test_availability_past_the_end_of_the_week(tmp_path):
+    # An evening poll on Sunday that runs past midnight in UTC, so that it ends on Monday
+    path = write_export(tmp_path / "sunday.json", ["2024-01-07"], [("A", "", [("2024-01-07 23:00", "2024-01-08 01:30")])],
+                        start="22:00:00.000Z", end="02:00:00.000Z")
+    store = ExportStore()
+    store.update([path])
+    index = cohort_engine.index_data(store, store)
+
+    assert index["possible_times"] == [(at("2024-01-07 22:00"), at("2024-01-08 02:00"))]
+    assert dict(index["participants"])["A"] == ((at("2024-01-07 23:00"), at("2024-01-08 01:30")),)
+
+
+def test_appending_an_export_reads_and_places_only_that_export(tmp_path, monkeypatch):
+    paths = [
+        write_export(tmp_path / f"poll{number}.json", ["2024-01-01"], [(f"P{number}_{i}", "", [("2024-01-01 09:00", "2024-01-01 11:00")]) for i in range(5)])
+        for number in range(3)
+    ]
+    store = ExportStore()
+    store.update(paths[:2])
+    participants(store)
+
+    read = []
+    placed = []
+    read_export, place_on_poll_times = exports.read_export, exports.place_on_poll_times
+    monkeypatch.setattr(exports, "read_export", lambda path: read.append(path) or read_export(path))
+    monkeypatch.setattr(exports, "place_on_poll_times", lambda intervals, times: placed.append(intervals) or place_on_poll_times(intervals, times))
+    store.update(paths)
+    result = participants(store)
+
+    assert read == [paths[2]]
+    assert len(placed) == 5
+    assert list(result) == [f"P{number}_{i}" for number in range(3) for i in range(5)]
+
+
+def test_removed_exports_are_dropped(tmp_path):
+    first = write_export(tmp_path / "first.json", ["2024-01-01"], [("A", "", [("2024-01-01 09:00", "2024-01-01 10:00")])])
+    second = write_export(tmp_path / "second.json", ["2024-01-01"], [("B", "", [("2024-01-01 09:00", "2024-01-01 10:00")])])
+    store = ExportStore()
+    store.update([first, second])
+    participants(store)
+    store.update([second])
+
+    assert list(store.exports) == [second]
+    assert list(participants(store)) == ["B"]
+
+
+def test_load_index_matches_the_merged_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(cohort_engine, "export_stores", {})
+    first = write_export(tmp_path / "first.json", ["2024-01-01", "2024-01-03"], [("A", "", [("2024-01-01 09:00", "2024-01-01 11:00"),
+                                                                                            ("2024-01-03 15:00", "2024-01-03 18:00")])])
+    second = write_export(tmp_path / "second.json", ["2024-01-08"], [("B", "", [("2024-01-08 08:00", "2024-01-08 12:00")])])
+    facilitators = write_export(tmp_path / "facilitators.json", ["2024-01-01", "2024-01-03"], [("F", "", [("2024-01-01 09:00", "2024-01-03 10:00")])])
+
+    index = cohort_engine.load_index({"participant_file_path": [first, second], "facilitator_file_path": facilitators})
+    merged = cohort_engine.load_export([first, second], "participant")
+    with open(facilitators) as file:
+        expected = cohort_engine.index_data(merged, json.load(file))
+    assert index == expected
+
+
+def test_no_exports():
+    with pytest.raises(ValueError):
+        ExportStore().possible_times()
@@ -0,0 +1,77 @@
+import pickle
+from datetime import datetime, timedelta
+
+import pytest
+
+import cohort_engine
+from intervals import Availability, normalize_intervals
+
+MONDAY = datetime(2024, 1, 1)
+
+
+def at(hour):
+    return MONDAY + timedelta(hours=hour)
+
+
+def spans(*hours):
+    return [(at(start), at(end)) for start, end in hours]
+
+
+def test_overlapping_intervals_are_merged():
+    assert normalize_intervals(spans((9, 11), (10, 12), (10.5, 11))) == tuple(spans((9, 12)))
+
+
+def test_adjacent_intervals_are_merged():
+    assert normalize_intervals(spans((9, 10), (10, 11), (11, 11.5))) == tuple(spans((9, 11.5)))
+
+
+def test_out_of_order_intervals_are_sorted():
+    availability = normalize_intervals(spans((14, 15), (9, 10), (12, 13), (9.5, 10.5)))
+    assert availability == tuple(spans((9, 10.5), (12, 13), (14, 15)))
+    assert availability.starts == (at(9), at(12), at(14))
+
+
+def test_empty_intervals_are_dropped():
+    assert normalize_intervals(spans((9, 9), (11, 10))) == ()
+
+
+def test_intervals_are_clipped_to_the_window():
+    window = spans((9, 17), (33, 41))
+    availability = normalize_intervals(spans((7, 10), (16, 34), (40, 42), (20, 22)), window)
+    assert availability == tuple(spans((9, 10), (16, 17), (33, 34), (40, 41)))
+
+
+def test_poll_running_past_midnight():
+    # An evening poll from 22:00 to 02:00 UTC ends on the day after each poll date
+    data = {"data": {"event": {"pollStartTime": "22:00:00.000Z", "pollEndTime": "02:00:00.000Z", "pollDates": ["2024-01-01", "2024-01-02"]}}}
+    possible_times = cohort_engine.get_possible_times(data)
+    assert possible_times == spans((22, 26), (46, 50))
+
+    # Availability across midnight stays one interval, and is clipped to the poll times on both days
+    availability = normalize_intervals(spans((21, 23), (23, 25.5), (45, 51)), possible_times)
+    assert availability == tuple(spans((22, 25.5), (46, 50)))
+    assert availability.covers(at(23.5), at(25))
+
+
+def test_covers_at_the_boundaries():
+    availability = normalize_intervals(spans((9, 11), (13, 15)))
+    assert availability.covers(at(9), at(11))
+    assert availability.covers(at(13), at(14.5))
+    assert availability.covers(at(10), at(10))
+    assert not availability.covers(at(8.5), at(10))
+    assert not availability.covers(at(10), at(11.5))
+    assert not availability.covers(at(10.5), at(13.5))
+    assert not availability.covers(at(11), at(12))
+    assert not availability.covers(at(15), at(16))
+    assert not Availability().covers(at(9), at(10))
+
+
+def test_availability_cannot_be_changed():
+    availability = normalize_intervals(spans((9, 10)))
+    with pytest.raises(AttributeError):
+        availability.append((at(11), at(12)))
+    with pytest.raises(TypeError):
+        availability[0] = (at(8), at(10))
+
+    copy = pickle.loads(pickle.dumps(availability))
+    assert copy == availability and copy.starts == availability.starts
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+import cohort_engine
+import job_server
+from test_cohort_engine import sample_params
+
+
+@pytest.fixture
+def server():
+    """A job server with one worker, listening on a free port on this computer. Yields its address."""
+    server = job_server.JobServer(workers=1)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    address = []
+
+    def listening(server_address):
+        address.append(server_address)
+        ready.set()
+
+    task = loop.create_task(server.serve(port=0, ready=listening))
+
+    def serve():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    yield address[0]
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+    loop.close()
+
+
+def cohorts(result):
+    return {course: [(cohort[0], cohort[1], tuple(cohort[2]), cohort[3]) for cohort in course_cohorts]
+            for course, course_cohorts in result["course cohorts"].items()}
+
+
+def test_job_matches_a_local_run_and_is_reused(server):
+    progress = []
+    result = job_server.process_data_on_server(server, sample_params(), on_progress=progress.append)
+
+    assert "Forming cohorts" in progress and progress[-1] == "Done"
+    assert any(message.startswith("Found cohorts placing") for message in progress)
+    assert all(isinstance(cohort[0], datetime) and isinstance(cohort[1], datetime) for course_cohorts in result["course cohorts"].values() for cohort in course_cohorts)
+    assert cohorts(result) == cohorts(cohort_engine.process_data(sample_params()))
+
+    progress = []
+    again = job_server.process_data_on_server(server, sample_params(), on_progress=progress.append)
+    assert progress == ["Reused an earlier result"]
+    assert again == result
+
+
+def test_time_limit(server):
+    with pytest.raises(TimeoutError):
+        job_server.process_data_on_server(server, sample_params(time_limit=0.001))
+
+
+def test_malformed_jobs_are_rejected_without_blocking_the_others(server):
+    with pytest.raises(ValueError, match="participant_file_path"):
+        job_server.process_data_on_server(server, sample_params(participant_file_path=None))
+    with pytest.raises(ValueError, match="Failed to load data"):
+        job_server.process_data_on_server(server, sample_params(participant_file_path="missing.json"))
+
+    result = job_server.process_data_on_server(server, sample_params())
+    assert sum(len(course_cohorts) for course_cohorts in result["course cohorts"].values()) == 6
+
+
+def run_and_stop(server, params):
+    """Run a job, stopping it as soon as it has found cohorts. Returns the result and the progress messages."""
+    job_id = job_server.submit_job(server, params)
+    progress = []
+
+    def stop_once_found(message):
+        progress.append(message)
+        if message.startswith("Found cohorts placing"):
+            job_server.stop_job(server, job_id)
+
+    return job_server.wait_for_job(server, job_id, on_progress=stop_once_found), progress
+
+
+def test_stopped_job_keeps_the_best_cohorts_so_far(server):
+    # Without a course filter and with no search time, the search on the sample polls runs for minutes
+    params = sample_params(filter_by_course=False, search_time=None)
+    result, _ = run_and_stop(server, params)
+    assert len(result["misc cohorts"]) == 6
+
+    # The result of a stopped job could be improved on, so it is not reused
+    _, progress = run_and_stop(server, params)
+    assert "Reused an earlier result" not in progress
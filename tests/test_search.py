@@ -0,0 +1,55 @@
+import pytest
+
+import cohort_engine
+from test_checkpoints import sample_search
+
+
+def test_each_selection_places_more_participants():
+    results = list(sample_search()())
+    values = [value for _, value, _ in results]
+
+    assert len(values) >= 2
+    assert all(earlier < later for earlier, later in zip(values, values[1:]))
+    assert all(value == sum(len(cohort[2]) for cohorts in selection.values() for cohort in cohorts) for selection, value, _ in results)
+
+
+def test_first_selection_is_the_one_select_best_cohorts_returns():
+    search = sample_search()
+    first = next(search())[0]
+    assert first == cohort_engine.select_best_cohorts_jointly(*search.arguments)
+
+    # The same holds for a single course
+    possible_cohorts, _, min_size, info = search.arguments
+    single_info = {name: [value[0], value[1]] for name, value in info.items() if "align" in value[2]}
+    first = next(cohort_engine.iter_best_cohorts(possible_cohorts["align"], 3, min_size, single_info))[0]
+    assert first == cohort_engine.select_best_cohorts(possible_cohorts["align"], 3, min_size, single_info)
+
+
+def test_should_stop_ends_the_search():
+    search = sample_search()
+    full = list(search())
+    found = []
+    best = cohort_engine.run_search(lambda stop: search(should_stop=stop), None, lambda selection, value, stats: found.append((selection, value, stats)),
+                                    lambda: bool(found))
+
+    assert len(found) == 1
+    assert best == full[0][0]
+    assert found[0][2]["nodes"] < full[-1][2]["nodes"]
+
+
+def test_time_limit_keeps_the_best_selection_so_far():
+    search = sample_search()
+    results = list(search())
+
+    def interrupted(stop):
+        yield from results[:2]
+        raise TimeoutError("The search took too long")
+
+    assert cohort_engine.run_search(interrupted, None) == results[1][0]
+
+    def nothing_found(stop):
+        raise TimeoutError("The search took too long")
+        yield
+
+    with pytest.raises(TimeoutError):
+        cohort_engine.run_search(nothing_found, None)